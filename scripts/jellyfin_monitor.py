@@ -8,14 +8,14 @@ import os
 import sys
 import time
 import json
+import heapq
 import logging
+import threading
 import requests
-from pathlib import Path
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from typing import Dict, List, Set
+from typing import Callable, Dict, List, Set
 import argparse
-from datetime import datetime, timedelta
 
 # Configure logging
 logging.basicConfig(
@@ -79,19 +79,186 @@ class JellyfinAPI:
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to refresh library {library_id}: {e}")
             return False
+    
+    def report_media_updated(self, updates: List[Dict[str, str]]) -> bool:
+        """Tell Jellyfin which paths changed so it only rescans those"""
+        try:
+            url = f"{self.server_url}/Library/Media/Updated"
+            payload = {'Updates': updates}
+            
+            response = self.session.post(url, json=payload)
+            response.raise_for_status()
+            
+            logger.info(f"Reported {len(updates)} changed path(s) to Jellyfin")
+            return True
+            
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to report {len(updates)} changed path(s): {e}")
+            return False
+
+class LibraryPathIndex:
+    """Longest-prefix lookup of the library owning a path, one trie step per path component"""
+    
+    class _Node:
+        __slots__ = ('children', 'library_id')
+        
+        def __init__(self):
+            self.children: Dict[str, 'LibraryPathIndex._Node'] = {}
+            self.library_id = ""
+    
+    def __init__(self, path_to_library: Dict[str, str]):
+        self.root = self._Node()
+        for lib_path, lib_id in path_to_library.items():
+            node = self.root
+            for part in os.path.abspath(lib_path).split(os.sep):
+                if part:
+                    node = node.children.setdefault(part, self._Node())
+            node.library_id = lib_id
+    
+    def lookup(self, file_path: str) -> str:
+        """Library id of the deepest library path containing file_path, or ''"""
+        if not os.path.isabs(file_path) or os.sep + '.' in file_path:
+            file_path = os.path.abspath(file_path)
+        node = self.root
+        best = node.library_id
+        for part in file_path.split(os.sep):
+            if not part:
+                continue
+            node = node.children.get(part)
+            if node is None:
+                break
+            if node.library_id:
+                best = node.library_id
+        return best
+
+class RefreshScheduler:
+    """
+    Fires each library's refresh at its deadline from a timer heap on one thread.
+    
+    Every event moves the deadline to debounce_seconds from now, but never past
+    max_wait_seconds after the first event of the batch, so a steady stream of
+    writes cannot postpone a refresh forever. A failed refresh is retried with
+    per-library exponential backoff. Lag (first event -> refresh) is logged.
+    """
+    
+    def __init__(self, refresh: Callable[[str], bool], debounce_seconds: float = 30,
+                 max_wait_seconds: float = 300, retry_seconds: float = 30, max_retry_seconds: float = 900):
+        self.refresh = refresh
+        self.debounce_seconds = debounce_seconds
+        self.max_wait_seconds = max(max_wait_seconds, debounce_seconds)
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.last_lag: Dict[str, float] = {}
+        self._heap: List[tuple] = []  # (deadline, library id); stale entries are skipped
+        self._deadlines: Dict[str, float] = {}
+        self._first_event: Dict[str, float] = {}
+        self._failures: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+    
+    def _push(self, library_id: str, deadline: float):
+        self._deadlines[library_id] = deadline
+        heapq.heappush(self._heap, (deadline, library_id))
+        self._cond.notify()
+    
+    def schedule(self, library_id: str) -> float:
+        """Register an event for the library; returns seconds until its refresh"""
+        with self._cond:
+            now = time.monotonic()
+            first = self._first_event.setdefault(library_id, now)
+            deadline = min(now + self.debounce_seconds, first + self.max_wait_seconds)
+            if self._failures.get(library_id) and library_id in self._deadlines:
+                # backing off: new events do not bring the retry forward
+                deadline = max(deadline, self._deadlines[library_id])
+            if self._deadlines.get(library_id) != deadline:
+                self._push(library_id, deadline)
+            return deadline - now
+    
+    def _next_due(self):
+        """Block until a library is due and return it, or None once stopped"""
+        with self._cond:
+            while not self._stopped:
+                while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                deadline, library_id = self._heap[0]
+                wait = deadline - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                del self._deadlines[library_id]
+                return library_id, self._first_event.pop(library_id, deadline)
+            return None
+    
+    def _run(self):
+        while True:
+            due = self._next_due()
+            if due is None:
+                return
+            library_id, first = due
+            try:
+                ok = self.refresh(library_id)
+            except Exception as e:
+                logger.error(f"Refresh of library {library_id} failed: {e}")
+                ok = False
+            now = time.monotonic()
+            lag = now - first
+            with self._cond:
+                if ok:
+                    self._failures.pop(library_id, None)
+                    self.last_lag[library_id] = lag
+                else:
+                    failures = self._failures[library_id] = self._failures.get(library_id, 0) + 1
+                    delay = min(self.max_retry_seconds, self.retry_seconds * 2 ** (failures - 1))
+                    # keep the original first event so the lag covers the retries
+                    self._first_event[library_id] = min(first, self._first_event.get(library_id, first))
+                    self._push(library_id, now + delay)
+            if ok:
+                logger.info(f"Refreshed library {library_id} {lag:.1f}s after its first change")
+                if lag > self.max_wait_seconds + 1:
+                    logger.warning(f"Library {library_id} refresh lagged {lag:.1f}s (max wait {self.max_wait_seconds}s)")
+            else:
+                logger.warning(f"Refresh of library {library_id} failed {failures} time(s); retrying in {delay:.0f}s")
+    
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="refresh-scheduler", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
 
 class LibraryChangeHandler(FileSystemEventHandler):
     """Handle filesystem events for library folders"""
     
     def __init__(self, jellyfin_api: JellyfinAPI, path_to_library: Dict[str, str], 
-                 debounce_seconds: int = 30):
+                 debounce_seconds: int = 30, full_refresh_threshold: int = 200,
+                 max_wait_seconds: int = 300, retry_seconds: int = 30, max_retry_seconds: int = 900):
         self.jellyfin_api = jellyfin_api
         self.path_to_library = path_to_library
+        self.library_index = LibraryPathIndex(path_to_library)
         self.debounce_seconds = debounce_seconds
-        self.pending_refreshes: Dict[str, datetime] = {}
+        self.full_refresh_threshold = full_refresh_threshold
+        self.scheduler = RefreshScheduler(self.refresh, debounce_seconds, max_wait_seconds,
+                                          retry_seconds, max_retry_seconds)
+        # Changed paths per library in the current debounce window: path -> update type.
+        # Written from the observer thread, taken by the scheduler thread.
+        self.pending_changes: Dict[str, Dict[str, str]] = {}
+        self._changes_lock = threading.Lock()
         
         # File extensions to monitor (add more as needed)
         self.monitored_extensions = {
+            '.strm',  # AutoStrm output
             '.mkv', '.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v',
             '.mp3', '.flac', '.wav', '.aac', '.ogg', '.wma', '.m4a',
             '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp',
@@ -102,15 +269,17 @@ class LibraryChangeHandler(FileSystemEventHandler):
         """Check if file should trigger a library refresh"""
         if not file_path:
             return False
-            
-        # Check file extension
-        ext = Path(file_path).suffix.lower()
-        if ext not in self.monitored_extensions:
+        
+        # One pass over the file name, no Path objects: this runs for every event
+        filename = file_path[file_path.rfind(os.sep) + 1:]
+        
+        # Ignore temporary files (AutoStrm writes .strm files through ".<name>.tmp")
+        if not filename or filename[0] in '.~':
             return False
         
-        # Ignore temporary files
-        filename = Path(file_path).name
-        if filename.startswith('.') or filename.startswith('~'):
+        # Check file extension
+        dot = filename.rfind('.')
+        if dot <= 0 or filename[dot:].lower() not in self.monitored_extensions:
             return False
         
         # Ignore partial downloads
@@ -121,73 +290,81 @@ class LibraryChangeHandler(FileSystemEventHandler):
     
     def get_library_for_path(self, file_path: str) -> str:
         """Find which library a file path belongs to"""
-        abs_path = os.path.abspath(file_path)
-        
-        # Find the most specific library path that contains this file
-        best_match = ""
-        best_library = ""
-        
-        for lib_path, lib_id in self.path_to_library.items():
-            abs_lib_path = os.path.abspath(lib_path)
-            if abs_path.startswith(abs_lib_path):
-                if len(abs_lib_path) > len(best_match):
-                    best_match = abs_lib_path
-                    best_library = lib_id
-        
-        return best_library
+        return self.library_index.lookup(file_path)
+    
+    def classify(self, file_path: str) -> str:
+        """Library id for a path that should trigger a refresh, or '' for paths to ignore"""
+        if not self.should_monitor_file(file_path):
+            return ""
+        return self.library_index.lookup(file_path)
+    
+    def record_change(self, library_id: str, file_path: str, update_type: str):
+        """Remember a changed path for the library's next refresh"""
+        with self._changes_lock:
+            changes = self.pending_changes.setdefault(library_id, {})
+            previous = changes.get(file_path)
+            if previous == 'Created' and update_type == 'Modified':
+                return  # still new to Jellyfin
+            if previous == 'Deleted' and update_type == 'Created':
+                update_type = 'Modified'  # replaced in place
+            changes[file_path] = update_type
     
     def schedule_refresh(self, library_id: str, library_name: str):
         """Schedule a library refresh with debouncing"""
         if not library_id:
             return
         
-        now = datetime.now()
-        self.pending_refreshes[library_id] = now + timedelta(seconds=self.debounce_seconds)
+        delay = self.scheduler.schedule(library_id)
         
         logger.info(f"Scheduled refresh for library '{library_name}' (ID: {library_id}) "
-                   f"in {self.debounce_seconds} seconds")
+                   f"in {delay:.0f} seconds")
     
-    def process_pending_refreshes(self):
-        """Process any pending library refreshes"""
-        now = datetime.now()
-        completed_refreshes = []
-        
-        for library_id, refresh_time in self.pending_refreshes.items():
-            if now >= refresh_time:
-                if self.jellyfin_api.refresh_library(library_id):
-                    completed_refreshes.append(library_id)
-                else:
-                    # Retry in 60 seconds on failure
-                    self.pending_refreshes[library_id] = now + timedelta(seconds=60)
-        
-        # Remove completed refreshes
-        for library_id in completed_refreshes:
-            del self.pending_refreshes[library_id]
+    def refresh(self, library_id: str) -> bool:
+        """Report the library's changed paths, or rescan it when too many changed"""
+        with self._changes_lock:
+            changes = self.pending_changes.pop(library_id, {})
+        if not changes:
+            # an earlier refresh already took this batch (its event scheduled us late)
+            return True
+        if len(changes) > self.full_refresh_threshold:
+            ok = self.jellyfin_api.refresh_library(library_id)
+        else:
+            updates = [{'Path': path, 'UpdateType': update_type} for path, update_type in changes.items()]
+            ok = self.jellyfin_api.report_media_updated(updates)
+        if not ok:
+            # keep them for the retry; changes recorded meanwhile are newer
+            with self._changes_lock:
+                self.pending_changes[library_id] = dict(changes, **self.pending_changes.get(library_id, {}))
+        return ok
     
     def on_created(self, event):
-        if not event.is_directory and self.should_monitor_file(event.src_path):
-            library_id = self.get_library_for_path(event.src_path)
+        if not event.is_directory:
+            library_id = self.classify(event.src_path)
             if library_id:
                 logger.info(f"File created: {event.src_path}")
+                self.record_change(library_id, event.src_path, 'Created')
                 self.schedule_refresh(library_id, "Library")
     
     def on_deleted(self, event):
-        if not event.is_directory and self.should_monitor_file(event.src_path):
-            library_id = self.get_library_for_path(event.src_path)
+        if not event.is_directory:
+            library_id = self.classify(event.src_path)
             if library_id:
                 logger.info(f"File deleted: {event.src_path}")
+                self.record_change(library_id, event.src_path, 'Deleted')
                 self.schedule_refresh(library_id, "Library")
     
     def on_moved(self, event):
         if not event.is_directory:
-            # Check both source and destination paths
-            for path in [event.src_path, event.dest_path]:
-                if self.should_monitor_file(path):
-                    library_id = self.get_library_for_path(path)
-                    if library_id:
+            # The source disappears and the destination appears, possibly in different libraries
+            logged = False
+            for path, update_type in [(event.src_path, 'Deleted'), (event.dest_path, 'Created')]:
+                library_id = self.classify(path)
+                if library_id:
+                    if not logged:
                         logger.info(f"File moved: {event.src_path} -> {event.dest_path}")
-                        self.schedule_refresh(library_id, "Library")
-                        break
+                        logged = True
+                    self.record_change(library_id, path, update_type)
+                    self.schedule_refresh(library_id, "Library")
 
 class JellyfinMonitor:
     """Main monitor class"""
@@ -210,7 +387,11 @@ class JellyfinMonitor:
             },
             "monitoring": {
                 "debounce_seconds": 30,
-                "recursive": True
+                "recursive": True,
+                "full_refresh_threshold": 200,
+                "max_wait_seconds": 300,
+                "retry_seconds": 30,
+                "max_retry_seconds": 900
             }
         }
         
@@ -238,7 +419,11 @@ class JellyfinMonitor:
             },
             "monitoring": {
                 "debounce_seconds": 30,
-                "recursive": True
+                "recursive": True,
+                "full_refresh_threshold": 200,
+                "max_wait_seconds": 300,
+                "retry_seconds": 30,
+                "max_retry_seconds": 900
             }
         }
         
@@ -281,7 +466,11 @@ class JellyfinMonitor:
         self.handler = LibraryChangeHandler(
             self.jellyfin_api,
             path_to_library,
-            self.config['monitoring']['debounce_seconds']
+            self.config['monitoring']['debounce_seconds'],
+            self.config['monitoring']['full_refresh_threshold'],
+            self.config['monitoring']['max_wait_seconds'],
+            self.config['monitoring']['retry_seconds'],
+            self.config['monitoring']['max_retry_seconds']
         )
         
         # Add watchers for each path
@@ -300,20 +489,20 @@ class JellyfinMonitor:
             return
         
         logger.info("Starting Jellyfin library monitor...")
+        # Refreshes fire from the scheduler thread at their deadlines
+        self.handler.scheduler.start()
         self.observer.start()
         
         try:
-            while True:
-                time.sleep(5)
-                # Process any pending refreshes
-                if self.handler:
-                    self.handler.process_pending_refreshes()
+            while self.observer.is_alive():
+                self.observer.join(1)
                     
         except KeyboardInterrupt:
             logger.info("Stopping monitor...")
             self.observer.stop()
         
         self.observer.join()
+        self.handler.scheduler.stop()
         logger.info("Monitor stopped")
 
 def main():
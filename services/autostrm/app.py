@@ -2,7 +2,7 @@ import os
 from flask import Flask, redirect, url_for
 from config import load_config, cfg
 from qbittorrent_compat import qb_api
-from worker import start_worker
+from leader import election
 
 
 def create_app() -> Flask:
@@ -19,6 +19,19 @@ def create_app() -> Flask:
     # Register qBittorrent-compatible API under /api/v2
     app.register_blueprint(qb_api, url_prefix="/api/v2")
 
+    # Lazy stream resolution for generated .strm files
+    from stream_redirect import strm_api  # noqa: E402
+    app.register_blueprint(strm_api, url_prefix="")
+
+    # Push notifications from TorBox (enabled by WEBHOOK_SECRET)
+    from webhook import webhook_api  # noqa: E402
+    app.register_blueprint(webhook_api, url_prefix="")
+
+    # Prometheus metrics
+    from metrics import instrument, metrics_api  # noqa: E402
+    instrument(app)
+    app.register_blueprint(metrics_api, url_prefix="")
+
     # Simple web UI
     @app.route("/")
     def index():
@@ -28,14 +41,15 @@ def create_app() -> Flask:
     from qbittorrent_compat import web_ui  # noqa: E402
     app.register_blueprint(web_ui, url_prefix="")
 
+    # Background worker, submission outbox and (direct mode) link refresher run
+    # in whichever process wins the leader lock, however many web workers exist
+    election.start()
+
     return app
 
 
 def main():
     app = create_app()
-    # Start background worker
-    start_worker()
-
     bind = cfg.AUTOSTRM_BIND
     port = int(cfg.AUTOSTRM_PORT)
     app.logger.info("Starting AutoStrm on %s:%s", bind, port)
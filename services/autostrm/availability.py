@@ -0,0 +1,50 @@
+import logging
+import threading
+import time
+import typing as t
+
+log = logging.getLogger("availability")
+
+
+class AvailabilityCache:
+    """
+    TTL cache in front of a batch cached-availability lookup.
+
+    `lookup` takes a list of info hashes and returns the set that is cached
+    (TorBoxClient.check_cached). Only hashes missing from the cache are sent,
+    in a single call.
+    """
+
+    def __init__(self, lookup: t.Callable[[list[str]], set[str]], ttl: float = 600.0) -> None:
+        self._lookup = lookup
+        self.ttl = ttl
+        self._entries: dict[str, tuple[float, bool]] = {}
+        self._lock = threading.Lock()
+
+    def check(self, hashes: t.Iterable[str]) -> dict[str, bool | None]:
+        """
+        Map each hash to True (cached), False (not cached) or None (unknown
+        because the lookup failed; callers should fail open).
+        """
+        hashes = [h.lower() for h in hashes if h]
+        now = time.monotonic()
+        result: dict[str, bool | None] = {}
+        with self._lock:
+            for h in hashes:
+                entry = self._entries.get(h)
+                if entry and entry[0] > now:
+                    result[h] = entry[1]
+        missing = [h for h in hashes if h not in result]
+        if missing:
+            try:
+                cached = {h.lower() for h in self._lookup(missing)}
+            except Exception as e:
+                log.warning("Availability check failed for %d hashes: %s", len(missing), e)
+                return dict(result, **{h: None for h in missing})
+            with self._lock:
+                if len(self._entries) > 10000:
+                    self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                for h in missing:
+                    result[h] = h in cached
+                    self._entries[h] = (now + self.ttl, result[h])
+        return result
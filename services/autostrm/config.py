@@ -1,7 +1,18 @@
+import functools
 import json
 import os
+import sqlite3
 import threading
+import time
+import zlib
+from contextlib import contextmanager
 from dataclasses import dataclass
+from typing import Iterable
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: a single process is assumed
+    fcntl = None
 
 _config_loaded = False
 _state_lock = threading.Lock()
@@ -31,6 +42,42 @@ class Config:
 
     LOG_LEVEL: str = os.environ.get("LOG_LEVEL", "info")
 
+    # READY jobs finished in parallel per worker cycle
+    WORKER_CONCURRENCY: str = os.environ.get("WORKER_CONCURRENCY", "4")
+    # Submission outbox: parallel TorBox submissions and max retry delay (seconds)
+    SUBMIT_CONCURRENCY: str = os.environ.get("SUBMIT_CONCURRENCY", "4")
+    SUBMIT_RETRY_MAX: str = os.environ.get("SUBMIT_RETRY_MAX", "600")
+    # .strm targets: "redirect" writes stable /strm/<hash>/<file_id> URLs on this
+    # service (resolved on first play); "direct" writes resolved TorBox links
+    STRM_MODE: str = os.environ.get("STRM_MODE", "")
+    AUTOSTRM_PUBLIC_URL: str = os.environ.get("AUTOSTRM_PUBLIC_URL", "")
+    STRM_LINK_TTL: str = os.environ.get("STRM_LINK_TTL", "3600")
+    # direct mode: refresh links this many seconds before expiry, at most N per batch
+    STRM_REFRESH_MARGIN: str = os.environ.get("STRM_REFRESH_MARGIN", "600")
+    STRM_REFRESH_BATCH: str = os.environ.get("STRM_REFRESH_BATCH", "50")
+
+    # What torrents/add does with grabs TorBox has not cached:
+    # submit (no precheck), queue (submit with as_queued) or reject (answer "Fails.")
+    UNCACHED_POLICY: str = os.environ.get("UNCACHED_POLICY", "submit")
+    AVAILABILITY_TTL: str = os.environ.get("AVAILABILITY_TTL", "600")
+    # the precheck runs inside torrents/add: one short attempt, then submit anyway
+    AVAILABILITY_TIMEOUT: str = os.environ.get("AVAILABILITY_TIMEOUT", "3")
+
+    # Push notifications: POST /webhook/torbox requires this secret (endpoint is
+    # disabled when empty); with webhooks on, polling drops to a safety-net interval
+    WEBHOOK_SECRET: str = os.environ.get("WEBHOOK_SECRET", "")
+    WEBHOOK_POLL_INTERVAL: str = os.environ.get("WEBHOOK_POLL_INTERVAL", "900")
+
+    # Background loops run in one elected process; seconds between leader heartbeats
+    LEADER_HEARTBEAT: str = os.environ.get("LEADER_HEARTBEAT", "10")
+
+    # Retention (0 disables a policy): deleted jobs are dropped, or archived if
+    # they had finished, after N hours; DONE and ERROR jobs are archived after N days
+    RETENTION_DELETED_HOURS: str = os.environ.get("RETENTION_DELETED_HOURS", "24")
+    RETENTION_DONE_DAYS: str = os.environ.get("RETENTION_DONE_DAYS", "7")
+    RETENTION_ERROR_DAYS: str = os.environ.get("RETENTION_ERROR_DAYS", "14")
+    RETENTION_INTERVAL: str = os.environ.get("RETENTION_INTERVAL", "3600")
+
     @property
     def puid(self) -> int:
         try:
@@ -45,23 +92,145 @@ class Config:
         except Exception:
             return 20
 
+    @property
+    def worker_concurrency(self) -> int:
+        try:
+            return max(1, int(self.WORKER_CONCURRENCY))
+        except Exception:
+            return 4
+
+    @property
+    def submit_concurrency(self) -> int:
+        try:
+            return max(1, int(self.SUBMIT_CONCURRENCY))
+        except Exception:
+            return 4
+
+    @property
+    def strm_mode(self) -> str:
+        # unset: redirect once Jellyfin can reach us, i.e. a public URL is configured
+        mode = self.STRM_MODE.strip().lower()
+        if mode in ("direct", "redirect"):
+            return mode
+        return "redirect" if self.public_url else "direct"
+
+    @property
+    def public_url(self) -> str:
+        # base URL Jellyfin uses to reach AutoStrm
+        return self.AUTOSTRM_PUBLIC_URL.strip().rstrip("/")
+
+    @property
+    def strm_link_ttl(self) -> float:
+        try:
+            return float(self.STRM_LINK_TTL)
+        except Exception:
+            return 3600.0
+
+    @property
+    def strm_refresh_margin(self) -> float:
+        try:
+            return float(self.STRM_REFRESH_MARGIN)
+        except Exception:
+            return 600.0
+
+    @property
+    def strm_refresh_batch(self) -> int:
+        try:
+            return max(1, int(self.STRM_REFRESH_BATCH))
+        except Exception:
+            return 50
+
+    @property
+    def uncached_policy(self) -> str:
+        policy = self.UNCACHED_POLICY.strip().lower()
+        return policy if policy in ("submit", "queue", "reject") else "submit"
+
+    @property
+    def availability_ttl(self) -> float:
+        try:
+            return float(self.AVAILABILITY_TTL)
+        except Exception:
+            return 600.0
+
+    @property
+    def availability_timeout(self) -> float:
+        try:
+            return float(self.AVAILABILITY_TIMEOUT)
+        except Exception:
+            return 3.0
+
+    @property
+    def submit_retry_max(self) -> int:
+        try:
+            return max(1, int(self.SUBMIT_RETRY_MAX))
+        except Exception:
+            return 600
+
+    @property
+    def webhook_secret(self) -> str:
+        return self.WEBHOOK_SECRET.strip()
+
+    @property
+    def webhook_poll_interval(self) -> float:
+        try:
+            return max(30.0, float(self.WEBHOOK_POLL_INTERVAL))
+        except Exception:
+            return 900.0
+
+    @property
+    def leader_heartbeat(self) -> float:
+        try:
+            return max(1.0, float(self.LEADER_HEARTBEAT))
+        except Exception:
+            return 10.0
+
+    def _retention_seconds(self, value: str, unit: float, default: float) -> float:
+        try:
+            return max(0.0, float(value)) * unit
+        except Exception:
+            return default * unit
+
+    @property
+    def retention_deleted(self) -> float:
+        return self._retention_seconds(self.RETENTION_DELETED_HOURS, 3600, 24)
+
+    @property
+    def retention_done(self) -> float:
+        return self._retention_seconds(self.RETENTION_DONE_DAYS, 86400, 7)
+
+    @property
+    def retention_error(self) -> float:
+        return self._retention_seconds(self.RETENTION_ERROR_DAYS, 86400, 14)
+
+    @property
+    def retention_interval(self) -> float:
+        try:
+            return max(60.0, float(self.RETENTION_INTERVAL))
+        except Exception:
+            return 3600.0
+
 
 cfg = Config()
 
 CONFIG_DIR = os.environ.get("CONFIG_DIR", "/config")
-STATE_FILE = os.path.join(CONFIG_DIR, "state.json")
+STATE_FILE = os.path.join(CONFIG_DIR, "state.json")  # legacy, migrated into STATE_DB
+STATE_DB = os.path.join(CONFIG_DIR, "state.db")
 CATEGORIES_FILE = os.path.join(CONFIG_DIR, "categories.json")
+TORRENTS_DIR = os.path.join(CONFIG_DIR, "torrents")  # uploaded .torrent files awaiting submission
+LEADER_LOCK = os.path.join(CONFIG_DIR, "leader.lock")
 
 
 def load_config():
     global _config_loaded
     if _config_loaded:
         return
+    if cfg.strm_mode == "redirect" and not cfg.public_url:
+        # .strm files would point at a URL Jellyfin cannot reach
+        raise RuntimeError("STRM_MODE=redirect requires AUTOSTRM_PUBLIC_URL (the base URL Jellyfin uses to reach AutoStrm)")
     os.makedirs(CONFIG_DIR, exist_ok=True)
+    os.makedirs(TORRENTS_DIR, exist_ok=True)
     # initialize files if not present
-    if not os.path.exists(STATE_FILE):
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
-            json.dump({"jobs": {}}, f)
+    state_store.migrate_from_json(STATE_FILE)
     if not os.path.exists(CATEGORIES_FILE):
         with open(CATEGORIES_FILE, "w", encoding="utf-8") as f:
             json.dump({cfg.CATEGORY_TV: {"savePath": cfg.MEDIA_TV_PATH},
@@ -69,23 +238,394 @@ def load_config():
     _config_loaded = True
 
 
+def _timed(op: str):
+    """Report a StateStore method's duration to StateStore.observe."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                self.observe(op, time.perf_counter() - start)
+        return inner
+    return wrap
+
+
 class StateStore:
-    def load_jobs(self) -> dict:
+    """
+    Job storage backed by SQLite in WAL mode.
+
+    Every job is its own row keyed by hash, so writers only touch the jobs they
+    changed and readers (API polls, dashboard) never wait on the worker.
+    Connections are per-thread; writes within this process are serialized by
+    _state_lock, and SQLite's busy timeout covers other processes.
+
+    Each write transaction bumps a store-wide version and stamps the rows it
+    touched (and tombstones for removed hashes) with it, so readers can cheaply
+    check whether anything moved and fetch only what did.
+    """
+
+    _UPSERT = "INSERT OR REPLACE INTO jobs (hash, state, category, added_on, data, rev) VALUES (?, ?, ?, ?, ?, ?)"
+
+    def __init__(self, path: str = STATE_DB) -> None:
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " hash TEXT PRIMARY KEY,"
+                " state TEXT NOT NULL,"
+                " category TEXT,"
+                " added_on INTEGER,"
+                " data TEXT NOT NULL)"
+            )
+            if "rev" not in {r[1] for r in conn.execute("PRAGMA table_info(jobs)")}:
+                try:
+                    conn.execute("ALTER TABLE jobs ADD COLUMN rev INTEGER NOT NULL DEFAULT 0")
+                except sqlite3.OperationalError:
+                    pass  # added concurrently by another process
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_rev ON jobs(rev)")
+            conn.execute("CREATE TABLE IF NOT EXISTS removed (hash TEXT PRIMARY KEY, rev INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS strm_files ("
+                " path TEXT PRIMARY KEY,"
+                " job_hash TEXT NOT NULL,"
+                " torrent_id INTEGER,"
+                " file_id INTEGER,"
+                " expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS strm_files_job ON strm_files(job_hash)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS archive ("
+                " hash TEXT PRIMARY KEY,"
+                " name TEXT,"
+                " category TEXT,"
+                " state TEXT,"
+                " added_on INTEGER,"
+                " archived_at INTEGER NOT NULL,"
+                " data BLOB NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS archive_archived_at ON archive(archived_at)")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(job: dict, rev: int) -> tuple:
+        return (
+            job["hash"],
+            job.get("state", "queued"),
+            job.get("category"),
+            int(job.get("added_on") or 0),
+            json.dumps(job, separators=(",", ":")),
+            rev,
+        )
+
+    @contextmanager
+    def _transaction(self):
+        """Yield (connection, new version) inside a write transaction."""
         with _state_lock:
-            with open(STATE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f).get("jobs", {})
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+                rev = int(conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+                yield conn, rev
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # Timing hook (op name, seconds); metrics.py installs a histogram here
+    observe = staticmethod(lambda op, seconds: None)
 
+    # --------------- Reads ---------------
+
+    def version(self) -> int:
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return int(row[0]) if row else 0
+
+    @_timed("load_jobs")
+    def load_jobs(self, states: Iterable[str] | None = None) -> dict:
+        conn = self._conn()
+        if states is None:
+            rows = conn.execute("SELECT hash, data FROM jobs").fetchall()
+        else:
+            states = list(states)
+            marks = ",".join("?" * len(states))
+            rows = conn.execute(f"SELECT hash, data FROM jobs WHERE state IN ({marks})", states).fetchall()
+        return {h: json.loads(data) for h, data in rows}
+
+    def count_by_state(self) -> dict[str, int]:
+        return dict(self._conn().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def get_job(self, job_hash: str) -> dict | None:
+        row = self._conn().execute("SELECT data FROM jobs WHERE hash = ?", (job_hash,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @_timed("changes_since")
+    def changes_since(self, rev: int) -> tuple[int, dict, set | None]:
+        """
+        Return (version, jobs written after rev, hashes removed after rev),
+        read from one consistent snapshot of the database.
+
+        Once compact() has dropped tombstones newer than rev, removals since rev
+        are unknown: removed is then None and changed holds every job, which
+        replaces the caller's view.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            version = int(conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+            floor = conn.execute("SELECT value FROM meta WHERE key = 'tombstone_floor'").fetchone()
+            if rev >= 0 and floor and rev < int(floor[0]):
+                rows, removed = conn.execute("SELECT hash, data FROM jobs").fetchall(), None
+            else:
+                rows = conn.execute("SELECT hash, data FROM jobs WHERE rev > ?", (rev,)).fetchall()
+                removed = {h for (h,) in conn.execute("SELECT hash FROM removed WHERE rev > ?", (rev,))}
+        finally:
+            conn.execute("COMMIT")
+        changed = {h: json.loads(data) for h, data in rows}
+        return version, changed, None if removed is None else removed - changed.keys()
+
+    # --------------- Writes ---------------
+
+    def put_job(self, job: dict) -> None:
+        self.put_jobs([job])
+
+    @_timed("put_jobs")
+    def put_jobs(self, jobs: Iterable[dict]) -> None:
+        jobs = list(jobs)
+        if not jobs:
+            return
+        with self._transaction() as (conn, rev):
+            conn.executemany(self._UPSERT, [self._row(j, rev) for j in jobs])
+
+    @_timed("update_jobs")
+    def update_jobs(self, changes: dict[str, dict]) -> set[str]:
+        """
+        Merge field changes into stored jobs ({hash: {field: value}}) in one transaction.
+        Fields not mentioned keep whatever another writer stored meanwhile.
+
+        Changes are usually computed outside the transaction, so a job deleted in
+        the meantime only accepts changes that delete it again; the hashes whose
+        changes were skipped for that reason are returned.
+        """
+        skipped: set[str] = set()
+        if not changes:
+            return skipped
+        with self._transaction() as (conn, rev):
+            rows = []
+            for h, fields in changes.items():
+                row = conn.execute("SELECT data FROM jobs WHERE hash = ?", (h,)).fetchone()
+                if not row:
+                    continue
+                job = json.loads(row[0])
+                if job.get("state") == "deleted" and fields.get("state") != "deleted":
+                    skipped.add(h)
+                    continue
+                job.update(fields)
+                rows.append(self._row(job, rev))
+            conn.executemany(self._UPSERT, rows)
+        return skipped
+
+    @_timed("delete_jobs")
+    def delete_jobs(self, hashes: Iterable[str]) -> None:
+        hashes = list(hashes)
+        if not hashes:
+            return
+        with self._transaction() as (conn, rev):
+            conn.executemany("DELETE FROM jobs WHERE hash = ?", [(h,) for h in hashes])
+            conn.executemany("INSERT OR REPLACE INTO removed (hash, rev) VALUES (?, ?)", [(h, rev) for h in hashes])
+
+    @_timed("save_jobs")
     def save_jobs(self, jobs: dict) -> None:
+        """Replace the whole job set. Prefer put_jobs/update_jobs for incremental changes."""
+        with self._transaction() as (conn, rev):
+            gone = {h for (h,) in conn.execute("SELECT hash FROM jobs")} - jobs.keys()
+            conn.execute("DELETE FROM jobs")
+            conn.executemany(self._UPSERT, [self._row(dict(j, hash=h), rev) for h, j in jobs.items()])
+            conn.executemany("INSERT OR REPLACE INTO removed (hash, rev) VALUES (?, ?)", [(h, rev) for h in gone])
+
+    # --------------- Retention ---------------
+    # Finished jobs move into a cold archive table: one row per job with the
+    # searchable columns in clear and the full job JSON zlib-compressed. They
+    # leave the jobs table (with a tombstone), so snapshots, the worker and API
+    # responses only ever see the working set.
+
+    @_timed("archive_jobs")
+    def archive_jobs(self, hashes: Iterable[str], now: int | None = None) -> int:
+        hashes = list(hashes)
+        if not hashes:
+            return 0
+        now = int(now or time.time())
+        with self._transaction() as (conn, rev):
+            marks = ",".join("?" * len(hashes))
+            rows = conn.execute(f"SELECT hash, data FROM jobs WHERE hash IN ({marks})", hashes).fetchall()
+            archived = []
+            for h, data in rows:
+                job = json.loads(data)
+                archived.append((h, job.get("name"), job.get("category"), job.get("state"),
+                                 int(job.get("added_on") or 0), now, zlib.compress(data.encode("utf-8"), 6)))
+            conn.executemany("INSERT OR REPLACE INTO archive VALUES (?, ?, ?, ?, ?, ?, ?)", archived)
+            conn.executemany("DELETE FROM jobs WHERE hash = ?", [(r[0],) for r in rows])
+            conn.executemany("INSERT OR REPLACE INTO removed (hash, rev) VALUES (?, ?)", [(r[0], rev) for r in rows])
+        return len(rows)
+
+    def count_archived(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM archive").fetchone()[0]
+
+    def get_archived(self, job_hash: str) -> dict | None:
+        row = self._conn().execute("SELECT data FROM archive WHERE hash = ?", (job_hash,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def search_archive(self, query: str = "", limit: int = 50, offset: int = 0) -> tuple[int, list[dict]]:
+        """(total matches, page) of archived jobs whose name contains query, newest first."""
+        where, params = "", []
+        if query:
+            where, params = " WHERE name LIKE ? ESCAPE '\\'", ["%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"]
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM archive{where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT hash, name, category, state, added_on, archived_at FROM archive{where}"
+            " ORDER BY archived_at DESC, added_on DESC LIMIT ? OFFSET ?", params + [limit, offset]
+        ).fetchall()
+        keys = ("hash", "name", "category", "state", "added_on", "archived_at")
+        return total, [dict(zip(keys, r)) for r in rows]
+
+    def compact(self, keep_revs: int = 10000) -> None:
+        """
+        Drop tombstones more than keep_revs versions old, checkpoint the WAL and
+        VACUUM when a quarter of the file is free pages.
+        """
         with _state_lock:
-            with open(STATE_FILE, "w", encoding="utf-8") as f:
-                json.dump({"jobs": jobs}, f, indent=2)
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = int(conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+                floor = version - keep_revs
+                if floor > 0 and conn.execute("SELECT 1 FROM removed WHERE rev < ? LIMIT 1", (floor,)).fetchone():
+                    conn.execute("DELETE FROM removed WHERE rev < ?", (floor,))
+                    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('tombstone_floor', ?)", (floor,))
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            pages = conn.execute("PRAGMA page_count").fetchone()[0]
+            if pages and free * 4 > pages:
+                conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    # --------------- .strm manifest ---------------
+    # One row per generated .strm file. expires_at is set when the file holds a
+    # direct TorBox link that has to be refreshed. These writes do not bump the
+    # job version.
+
+    @_timed("record_strm_files")
+    def record_strm_files(self, job_hash: str, rows: Iterable[tuple[str, int | None, int | None, float | None]]) -> None:
+        """rows: (path, torrent_id, file_id, expires_at)"""
+        rows = [(path, job_hash, tid, fid, exp) for path, tid, fid, exp in rows]
+        if not rows:
+            return
+        with _state_lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO strm_files (path, job_hash, torrent_id, file_id, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def strm_links(self) -> list[tuple[str, str, int, int, float]]:
+        """(path, job_hash, torrent_id, file_id, expires_at) of every file holding an expiring link."""
+        return self._conn().execute(
+            "SELECT path, job_hash, torrent_id, file_id, expires_at FROM strm_files WHERE expires_at IS NOT NULL"
+        ).fetchall()
+
+    def strm_files_for(self, job_hash: str) -> list[str]:
+        return [p for (p,) in self._conn().execute("SELECT path FROM strm_files WHERE job_hash = ?", (job_hash,))]
+
+    def forget_strm_files(self, paths: Iterable[str]) -> None:
+        paths = [(p,) for p in paths]
+        if not paths:
+            return
+        with _state_lock:
+            self._conn().executemany("DELETE FROM strm_files WHERE path = ?", paths)
+
+    # --------------- Migration ---------------
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """
+        One-time import of the legacy state.json. The file is renamed to
+        *.migrated afterwards so the import never runs twice. Every gunicorn
+        worker calls this at boot, so the import runs under an exclusive lock
+        and a worker that finds the file already gone just returns.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        lock_fd = os.open(json_path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            try:
+                with open(json_path, "r", encoding="utf-8") as f:
+                    try:
+                        jobs = json.load(f).get("jobs", {})
+                    except ValueError:
+                        jobs = {}
+            except FileNotFoundError:
+                return 0  # another process imported it first
+            with self._transaction() as (conn, rev):
+                conn.executemany(
+                    self._UPSERT.replace("OR REPLACE", "OR IGNORE"),
+                    [self._row(dict(j, hash=h), rev) for h, j in jobs.items()],
+                )
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)", (json_path,))
+            try:
+                os.replace(json_path, json_path + ".migrated")
+            except FileNotFoundError:
+                pass
+            return len(jobs)
+        finally:
+            os.close(lock_fd)  # releases the flock
 
 
 class CategoriesStore:
+    """
+    categories.json with an mtime-keyed in-memory copy, so polls that only
+    need the category map do not re-read the file when it has not changed.
+    """
+
+    def __init__(self) -> None:
+        self._cached: tuple[int, dict] | None = None
+
+    def version(self) -> int:
+        try:
+            return os.stat(CATEGORIES_FILE).st_mtime_ns
+        except OSError:
+            return 0
+
     def load(self) -> dict:
         with _categories_lock:
-            with open(CATEGORIES_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
+            mtime = self.version()
+            if self._cached is None or self._cached[0] != mtime:
+                with open(CATEGORIES_FILE, "r", encoding="utf-8") as f:
+                    self._cached = (mtime, json.load(f))
+            return dict(self._cached[1])
 
     def save(self, categories: dict) -> None:
         with _categories_lock:
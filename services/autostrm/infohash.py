@@ -0,0 +1,80 @@
+import base64
+import binascii
+import hashlib
+import re
+from urllib.parse import parse_qs, urlparse
+
+_BTIH = re.compile(r"^urn:btih:([0-9a-fA-F]{40}|[A-Za-z2-7]{32})$")
+
+
+def magnet_info_hash(magnet: str) -> str | None:
+    """
+    Lowercase hex v1 info hash from a magnet's xt=urn:btih: value (hex or base32).
+    """
+    try:
+        xts = parse_qs(urlparse(magnet).query).get("xt", [])
+    except Exception:
+        return None
+    for xt in xts:
+        m = _BTIH.match(xt.strip())
+        if not m:
+            continue
+        value = m.group(1)
+        if len(value) == 40:
+            return value.lower()
+        try:
+            return binascii.hexlify(base64.b32decode(value.upper())).decode("ascii")
+        except (binascii.Error, ValueError):
+            return None
+    return None
+
+
+def _skip(data: bytes, i: int) -> int:
+    """Return the offset just past the bencoded value starting at data[i]."""
+    c = data[i:i + 1]
+    if c == b"i":
+        return data.index(b"e", i) + 1
+    if c in (b"l", b"d"):
+        i += 1
+        while data[i:i + 1] != b"e":
+            i = _skip(data, i)
+        return i + 1
+    if c.isdigit():
+        colon = data.index(b":", i)
+        return colon + 1 + int(data[i:colon])
+    raise ValueError(f"invalid bencode at offset {i}")
+
+
+def parse_torrent(data: bytes) -> tuple[str | None, str | None]:
+    """
+    (info hash, info.name) of a .torrent file. The hash is SHA1 over the exact
+    bencoded bytes of the top-level "info" dictionary, as clients compute it.
+    """
+    try:
+        if data[:1] != b"d":
+            return None, None
+        i = 1
+        while data[i:i + 1] != b"e":
+            key_end = _skip(data, i)
+            key = data[data.index(b":", i) + 1:key_end]
+            value_end = _skip(data, key_end)
+            if key == b"info":
+                info = data[key_end:value_end]
+                return hashlib.sha1(info).hexdigest(), _info_name(info)
+            i = value_end
+    except (ValueError, IndexError):
+        pass
+    return None, None
+
+
+def _info_name(info: bytes) -> str | None:
+    i = 1
+    while info[i:i + 1] != b"e":
+        key_end = _skip(info, i)
+        key = info[info.index(b":", i) + 1:key_end]
+        value_end = _skip(info, key_end)
+        if key == b"name" and info[key_end:key_end + 1].isdigit():
+            raw = info[info.index(b":", key_end) + 1:value_end]
+            return raw.decode("utf-8", errors="replace")
+        i = value_end
+    return None
@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from config import cfg, state_store, LEADER_LOCK
+from link_refresher import refresher
+from metrics import LEADER
+import retention
+import submitter
+import worker
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: a single process is assumed
+    fcntl = None
+
+log = logging.getLogger("leader")
+
+
+class LeaderElection:
+    """
+    Elects the one process that runs the background loops (submitter, worker,
+    retention, link refresher) when several web processes share /config.
+
+    The leader holds an exclusive flock on `path`. The kernel drops the lock when
+    its process exits or crashes, and a standby retrying every `retry` seconds
+    takes over. While leading, a heartbeat (pid, host, time) is written into the
+    lock file every `heartbeat` seconds, the loops are restarted if one has died,
+    and store writes made by other processes (new grabs) wake the loops here.
+    """
+
+    def __init__(self, path: str, on_elected, on_change=None, heartbeat: float = 10.0, retry: float = 5.0, poll: float = 1.0) -> None:
+        self.path = path
+        self.on_elected = on_elected
+        self.on_change = on_change
+        self.heartbeat = heartbeat
+        self.retry = retry
+        self.poll = poll
+        self.is_leader = False
+        self._fd: int | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def _try_acquire(self) -> bool:
+        if fcntl is None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def _beat(self) -> None:
+        if self._fd is None:
+            return
+        record = json.dumps({"pid": os.getpid(), "host": socket.gethostname(), "heartbeat": time.time()}).encode()
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, record, 0)
+
+    def current(self) -> dict | None:
+        """Last heartbeat record of whichever process leads."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.loads(f.read() or "null")
+        except (OSError, ValueError):
+            return None
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self._try_acquire():
+                    break
+            except OSError:
+                log.exception("Leader lock %s unusable", self.path)
+            holder = self.current()
+            if holder and time.time() - float(holder.get("heartbeat") or 0) > 3 * self.heartbeat:
+                log.warning("Leader pid %s has not sent a heartbeat for %.0fs", holder.get("pid"), time.time() - holder["heartbeat"])
+            self._stop.wait(self.retry)
+        if self._stop.is_set():
+            return
+
+        self.is_leader = True
+        LEADER.set(1)
+        log.info("Process %s elected to run background jobs", os.getpid())
+        version = state_store.version()
+        last_beat = 0.0
+        while not self._stop.is_set():
+            now = time.time()
+            try:
+                if now - last_beat >= self.heartbeat:
+                    self._beat()
+                    self.on_elected()  # idempotent; restarts any loop that died
+                    last_beat = now
+                current = state_store.version()
+                if current != version:
+                    version = current
+                    if self.on_change:
+                        self.on_change()
+            except Exception:
+                log.exception("Leader heartbeat failed")
+            self._stop.wait(self.poll)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="autostrm-leader", daemon=True)
+        self._thread.start()
+
+
+def _start_background() -> None:
+    submitter.start_submitter()
+    worker.start_worker()
+    retention.start_retention()
+    if cfg.strm_mode == "direct":
+        refresher.start()
+
+
+def _wake_background() -> None:
+    submitter.wake()
+    worker.wake()
+
+
+election = LeaderElection(LEADER_LOCK, _start_background, _wake_background, heartbeat=cfg.leader_heartbeat)
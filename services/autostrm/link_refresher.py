@@ -0,0 +1,206 @@
+import base64
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlparse
+from config import cfg, state_store
+from torbox_client import TorBoxClient
+from metrics import REFRESH_PENDING
+
+log = logging.getLogger("link_refresher")
+
+
+def _jwt_exp(token: str) -> float | None:
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(parts[1] + "=" * (-len(parts[1]) % 4)))
+        return float(payload["exp"])
+    except Exception:
+        return None
+
+
+# a presigned link claiming to outlive this is misparsed (or not a timestamp)
+_MAX_LINK_LIFETIME = 365 * 86400
+
+
+def link_expiry(url: str, default_ttl: float) -> float:
+    """
+    Unix time a presigned link stops working: Expires / X-Amz-Date+X-Amz-Expires
+    query parameters or the exp claim of a JWT-style token, else now + default_ttl.
+    Values already in the past or implausibly far ahead (e.g. a relative
+    duration or a millisecond stamp under `expires`) are ignored.
+    """
+    now = time.time()
+    for exp in _expiry_candidates(url):
+        if now < exp <= now + _MAX_LINK_LIFETIME:
+            return exp
+    return now + default_ttl
+
+
+def _expiry_candidates(url: str):
+    try:
+        q = {k.lower(): v[0] for k, v in parse_qs(urlparse(url).query).items()}
+    except Exception:
+        q = {}
+    for key in ("expires", "exp", "e"):
+        if q.get(key, "").isdigit():
+            yield float(q[key])
+    if "x-amz-date" in q and q.get("x-amz-expires", "").isdigit():
+        try:
+            signed = datetime.strptime(q["x-amz-date"], "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+            yield signed.timestamp() + int(q["x-amz-expires"])
+        except ValueError:
+            pass
+    for key in ("token", "presigned_token", "jwt"):
+        if key in q:
+            exp = _jwt_exp(q[key])
+            if exp:
+                yield exp
+    for segment in urlparse(url).path.split("/"):
+        exp = _jwt_exp(segment)
+        if exp:
+            yield exp
+
+
+class LinkRefresher:
+    """
+    Keeps direct-mode .strm files ahead of link expiry.
+
+    A min-heap holds (expires_at, path) for every generated file. The thread
+    sleeps until the earliest deadline minus `margin`, then re-resolves only the
+    files due by then, at most `batch` per round, through the shared
+    (rate-limited) TorBoxClient and rewrites them in place.
+    """
+
+    def __init__(self, client: TorBoxClient | None = None, margin: float = 600.0, batch: int = 50,
+                 retry_base: float = 60.0, retry_max: float = 3600.0, max_failures: int = 8) -> None:
+        self.client = client or TorBoxClient()
+        self.margin = margin
+        self.batch = batch
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_failures = max_failures
+        self._failures: dict[str, int] = {}
+        self._heap: list[tuple[float, str]] = []
+        self._links: dict[str, tuple[str, int, int, float]] = {}  # path -> (job_hash, torrent_id, file_id, expires_at)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stop = False
+
+    def load(self) -> None:
+        with self._lock:
+            for path, job_hash, tid, fid, exp in state_store.strm_links():
+                self._links[path] = (job_hash, tid, fid, exp)
+            self._heap = [(exp, path) for path, (_h, _t, _f, exp) in self._links.items()]
+            heapq.heapify(self._heap)
+
+    def track(self, job_hash: str, rows: list[tuple[str, int | None, int | None, float | None]]) -> None:
+        """Register freshly written files: rows of (path, torrent_id, file_id, expires_at)."""
+        with self._lock:
+            earliest = self._heap[0][0] if self._heap else None
+            for path, tid, fid, exp in rows:
+                if exp is None or tid is None or fid is None:
+                    continue
+                self._links[path] = (job_hash, tid, fid, exp)
+                heapq.heappush(self._heap, (exp, path))
+            if self._heap and (earliest is None or self._heap[0][0] < earliest):
+                self._wake.set()
+
+    def _due(self, now: float) -> list[tuple[str, str, int, int]]:
+        due = []
+        with self._lock:
+            while self._heap and len(due) < self.batch and self._heap[0][0] - self.margin <= now:
+                exp, path = heapq.heappop(self._heap)
+                link = self._links.get(path)
+                if link is None or link[3] != exp:
+                    continue  # superseded by a newer entry for this path
+                due.append((path, link[0], link[1], link[2]))
+        return due
+
+    def _next_deadline(self) -> float | None:
+        with self._lock:
+            return self._heap[0][0] - self.margin if self._heap else None
+
+    def refresh_due(self, now: float | None = None) -> int:
+        """Refresh one batch of files due by `now`; returns how many were rewritten."""
+        from strm_generator import write_text_file
+
+        due = self._due(now or time.time())
+        missing = [d[0] for d in due if not os.path.exists(d[0])]
+        if missing:
+            with self._lock:
+                for path in missing:
+                    self._links.pop(path, None)
+                    self._failures.pop(path, None)
+            state_store.forget_strm_files(missing)
+        due = [d for d in due if d[0] not in missing]
+        if not due:
+            return 0
+        urls = self.client.map_concurrent(lambda d: self.client.get_stream_url(d[2], d[3]), due)
+        rewritten, rows, retries, dead = 0, {}, {}, {}
+        for (path, job_hash, tid, fid), url in zip(due, urls):
+            if isinstance(url, Exception) or not url:
+                failures = self._failures[path] = self._failures.get(path, 0) + 1
+                if failures >= self.max_failures:
+                    # e.g. the torrent was deleted on TorBox: keep the file in the
+                    # manifest but stop refreshing it
+                    log.warning("Link refresh failed %d times for %s, giving up: %s", failures, path, url)
+                    self._failures.pop(path)
+                    with self._lock:
+                        self._links.pop(path, None)
+                    dead.setdefault(job_hash, []).append((path, tid, fid, None))
+                    continue
+                backoff = min(self.retry_max, self.retry_base * 2 ** (failures - 1))
+                log.warning("Link refresh failed for %s (retry in %.0fs): %s", path, backoff, url)
+                # in memory only, so strm_files keeps the link's real expiry; _due
+                # fires at expires_at - margin, i.e. after the backoff
+                retries.setdefault(job_hash, []).append((path, tid, fid, time.time() + self.margin + backoff))
+                continue
+            self._failures.pop(path, None)
+            write_text_file(path, url.strip() + "\n")
+            rewritten += 1
+            rows.setdefault(job_hash, []).append((path, tid, fid, link_expiry(url, cfg.strm_link_ttl)))
+        # a fresh link that is due again at once (its lifetime is shorter than the
+        # margin) waits retry_base, in memory only, instead of being re-resolved
+        # in a tight loop
+        floor = time.time() + self.margin + self.retry_base
+        for job_hash, job_rows in rows.items():
+            state_store.record_strm_files(job_hash, job_rows)
+            self.track(job_hash, [(path, tid, fid, max(exp, floor)) for path, tid, fid, exp in job_rows])
+        for job_hash, job_rows in retries.items():
+            self.track(job_hash, job_rows)
+        for job_hash, job_rows in dead.items():
+            state_store.record_strm_files(job_hash, job_rows)
+        return rewritten
+
+    def _loop(self) -> None:
+        self.load()
+        while not self._stop:
+            try:
+                if self.refresh_due():
+                    # more may be due; rewritten links are never due again right
+                    # away, and the limiter paces the batches
+                    continue
+            except Exception:
+                log.exception("Link refresh round failed")
+            REFRESH_PENDING.set(len(self._links))
+            deadline = self._next_deadline()
+            timeout = 300.0 if deadline is None else min(300.0, max(1.0, deadline - time.time()))
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="autostrm-links", daemon=True)
+        self._thread.start()
+
+
+refresher = LinkRefresher(margin=cfg.strm_refresh_margin, batch=cfg.strm_refresh_batch)
@@ -0,0 +1,416 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import Blueprint, Flask, Response, g, request
+from config import CONFIG_DIR, STATE_DB, state_store
+from torbox_client import TorBoxClient, _shared_list_cache
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: exited processes' files are kept as they are
+    fcntl = None
+
+# Minimal Prometheus text-format (0.0.4) registry, to avoid a client dependency.
+# Every web process records its own series and flushes them to a file under
+# METRICS_DIR; /metrics merges all files, so a scrape answered by any gunicorn
+# worker sees the leader's worker/submitter series and totals over all processes.
+
+METRICS_DIR = os.path.join(CONFIG_DIR, "metrics")
+_FLUSH_INTERVAL = 5.0
+
+_DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+metrics_api = Blueprint("metrics_api", __name__)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: tuple, values: tuple, extra: tuple = ()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    # Whether the series are flushed and merged across processes
+    shared = True
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def dump(self) -> list:
+        """[[label values, value], ...] for the per-process file."""
+        with self._lock:
+            return [[list(k), v] for k, v in self._values.items()]
+
+    @staticmethod
+    def merge(a, b):
+        return a + b
+
+    def samples(self, values: dict | None = None) -> list[tuple[str, tuple, tuple, float]]:
+        """(suffix, label values, extra labels, value) rows."""
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        return [("", k, (), v) for k, v in values.items()]
+
+    def render(self, values: dict | None = None) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples(values):
+            lines.append(f"{self.name}{suffix}{_fmt_labels(self.labelnames, key, extra)} {_fmt_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """
+    A settable gauge, or one computed at scrape time by `collect` ({label values: value}).
+    Settable gauges are summed over live processes; collected ones are computed by
+    the process answering the scrape (they read shared state such as state.db).
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), collect=None) -> None:
+        super().__init__(name, help, labelnames)
+        self._collect = collect
+        self.shared = collect is None
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self, values: dict | None = None) -> list[tuple[str, tuple, tuple, float]]:
+        if self._collect is None:
+            return super().samples(values)
+        try:
+            return [("", tuple(map(str, k)), (), v) for k, v in self._collect().items()]
+        except Exception:
+            return []
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = _DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]  # per-bucket counts, sum, count
+            if i < len(self.buckets):
+                state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def totals(self, **labels) -> tuple[int, float]:
+        """(count, sum) of one series."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (state[2], state[1]) if state else (0, 0.0)
+
+    def quantile(self, q: float, **labels) -> float | None:
+        """Estimate a quantile from the buckets, interpolating like histogram_quantile()."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if not state or not state[2]:
+                return None
+            counts, n = list(state[0]), state[2]
+        rank, cumulative, lower = q * n, 0, 0.0
+        for bound, c in zip(self.buckets, counts):
+            if c and cumulative + c >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / c
+            cumulative += c
+            lower = bound
+        return self.buckets[-1]
+
+    def dump(self) -> list:
+        with self._lock:
+            return [[list(k), [list(v[0]), v[1], v[2]]] for k, v in self._values.items()]
+
+    @staticmethod
+    def merge(a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]]
+
+    def samples(self, values: dict | None = None) -> list[tuple[str, tuple, tuple, float]]:
+        rows = []
+        if values is None:
+            with self._lock:
+                values = {k: [list(v[0]), v[1], v[2]] for k, v in self._values.items()}
+        for key, (counts, total, n) in values.items():
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                rows.append(("_bucket", key, (("le", _fmt_value(bound)),), cumulative))
+            rows.append(("_bucket", key, (("le", "+Inf"),), n))
+            rows.append(("_sum", key, (), total))
+            rows.append(("_count", key, (), n))
+        return rows
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # exists, owned by someone else
+    return True
+
+
+def _proc_start(pid: int) -> str | None:
+    """Start time of a process in clock ticks since boot (/proc/<pid>/stat), if known."""
+    try:
+        with open(f"/proc/{pid}/stat", "r", encoding="utf-8") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # comm may contain spaces and parentheses: fields resume after the last ")"
+    fields = stat.rsplit(")", 1)[-1].split()
+    return fields[19] if len(fields) > 19 else None
+
+
+def _writer_alive(data: dict) -> bool:
+    """
+    Whether the process that wrote a metrics file is still running. Pids are
+    reused (a restarted container numbers its processes from 1 again), so the
+    writer's start time has to match too; without /proc only the pid is checked.
+    """
+    pid = int(data.get("pid") or 0)
+    if not _pid_alive(pid):
+        return False
+    started = _proc_start(pid)
+    return started is None or started == data.get("started")
+
+
+class Registry:
+    """
+    Metrics of this process, plus the cross-process view.
+
+    flush() writes this process's shared series to METRICS_DIR/<pid>-<start>.json,
+    along with its pid and /proc start time to tell whether it is still alive.
+    render() merges every file there: counters and histograms are summed over all
+    processes, including exited ones, so totals never go backwards when a worker
+    is replaced; settable gauges only over processes still alive.
+    """
+
+    def __init__(self, directory: str | None = None) -> None:
+        self._metrics: list[_Metric] = []
+        self.directory = directory
+        self._file = f"{os.getpid()}-{int(time.time() * 1000)}.json"
+        self._flush_lock = threading.Lock()
+        self._flusher: threading.Thread | None = None
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def flush(self) -> None:
+        if not self.directory:
+            return
+        with self._flush_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, self._file)
+            data = {"pid": os.getpid(), "started": _proc_start(os.getpid()), "metrics": {m.name: m.dump() for m in self._metrics if m.shared}}
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, path)
+
+    def _read(self) -> list[tuple[str, dict]]:
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    files.append((name, json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return files
+
+    def _merge_files(self, files: list[dict], gauges: bool = True) -> dict[str, dict]:
+        merged: dict[str, dict] = {m.name: {} for m in self._metrics if m.shared}
+        by_name = {m.name: m for m in self._metrics}
+        for data in files:
+            alive = _writer_alive(data)
+            for metric_name, rows in data.get("metrics", {}).items():
+                m = by_name.get(metric_name)
+                if m is None or not m.shared or (m.kind == "gauge" and not (gauges and alive)):
+                    continue
+                values = merged[metric_name]
+                for key, value in rows:
+                    key = tuple(key)
+                    values[key] = m.merge(values[key], value) if key in values else value
+        return merged
+
+    def _merged(self) -> dict[str, dict]:
+        return self._merge_files([data for _name, data in self._read()])
+
+    def retire(self) -> None:
+        """Fold the files of exited processes into retired.json (under a lock, so once)."""
+        if not self.directory or fcntl is None:
+            return
+        fd = os.open(os.path.join(self.directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            files = self._read()
+            dead = [(n, d) for n, d in files if n != "retired.json" and not _writer_alive(d)]
+            if not dead:
+                return
+            retired = [d for n, d in files if n == "retired.json"]
+            merged = self._merge_files(retired + [d for _n, d in dead], gauges=False)
+            data = {"pid": 0, "metrics": {name: [[list(k), v] for k, v in values.items()]
+                                          for name, values in merged.items() if values}}
+            path = os.path.join(self.directory, "retired.json")
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(path + ".tmp", path)
+            for name, _d in dead:
+                os.remove(os.path.join(self.directory, name))
+        finally:
+            os.close(fd)
+
+    def render(self) -> str:
+        merged = None
+        if self.directory:
+            try:
+                self.flush()
+                merged = self._merged()
+            except OSError:
+                merged = None  # unwritable directory: this process only
+        lines: list[str] = []
+        for m in self._metrics:
+            lines.extend(m.render(merged.get(m.name) if merged is not None and m.shared else None))
+        return "\n".join(lines) + "\n"
+
+    def start_flusher(self, interval: float = _FLUSH_INTERVAL) -> None:
+        """Flush periodically so other processes see recent values of this one,
+        and now and then retire the files of exited processes."""
+        if not self.directory or (self._flusher and self._flusher.is_alive()):
+            return
+
+        def loop():
+            rounds = 0
+            while True:
+                time.sleep(interval)
+                try:
+                    self.flush()
+                    rounds += 1
+                    if rounds % 60 == 0:
+                        self.retire()
+                except OSError:
+                    pass
+
+        self._flusher = threading.Thread(target=loop, name="autostrm-metrics", daemon=True)
+        self._flusher.start()
+
+
+REGISTRY = Registry(METRICS_DIR)
+
+
+def _state_db_bytes() -> dict:
+    return {(suffix.lstrip("-") or "db",): os.path.getsize(STATE_DB + suffix)
+            for suffix in ("", "-wal") if os.path.exists(STATE_DB + suffix)}
+
+
+HTTP_LATENCY = Histogram(
+    "autostrm_http_request_duration_seconds", "Request latency per route", ("route", "method", "status"))
+TORBOX_LATENCY = Histogram(
+    "autostrm_torbox_request_duration_seconds", "TorBox API call latency per endpoint (status=error: no response)",
+    ("endpoint", "method", "status"))
+WORKER_CYCLE = Histogram(
+    "autostrm_worker_cycle_duration_seconds", "Duration of worker cycles that checked at least one job")
+WORKER_CYCLE_JOBS = Histogram(
+    "autostrm_worker_cycle_jobs", "Jobs checked per worker cycle", buckets=(1, 5, 10, 50, 100, 500, 1000, 5000))
+WORKER_JOBS = Counter("autostrm_worker_jobs_processed_total", "Jobs checked by the worker")
+WORKER_SCHEDULED = Gauge("autostrm_worker_scheduled_jobs", "Jobs waiting in the worker's deadline queue")
+SUBMIT_OUTBOX = Gauge("autostrm_submit_outbox_due", "Outbox jobs due for submission in the last submitter pass")
+SUBMIT_RESULTS = Counter("autostrm_submit_total", "Submission attempts by outcome", ("outcome",))
+RETENTION_RESULTS = Counter("autostrm_retention_jobs_total", "Finished jobs moved out of the working set", ("outcome",))
+REFRESH_PENDING = Gauge("autostrm_strm_refresh_tracked", "Direct-mode .strm files tracked for link refresh")
+STORE_LATENCY = Histogram(
+    "autostrm_state_store_duration_seconds", "StateStore operation duration", ("op",))
+ARCHIVED_JOBS = Gauge("autostrm_archived_jobs", "Jobs in the compressed archive",
+                      collect=lambda: {(): state_store.count_archived()})
+STORE_BYTES = Gauge("autostrm_state_store_bytes", "Size of state.db and its WAL", ("file",), collect=_state_db_bytes)
+JOBS_BY_STATE = Gauge("autostrm_jobs", "Jobs by state", ("state",),
+                      collect=lambda: {(s,): n for s, n in state_store.count_by_state().items()})
+TORBOX_CACHE = Gauge("autostrm_torbox_list_cache", "Shared mylist/getqueued cache counters", ("stat",),
+                     collect=lambda: {(k,): v for k, v in _shared_list_cache.stats().items()})
+
+state_store.observe = lambda op, seconds: STORE_LATENCY.observe(seconds, op=op)
+TorBoxClient.observe = staticmethod(
+    lambda path, method, status, seconds: TORBOX_LATENCY.observe(seconds, endpoint=path, method=method, status=status))
+
+
+LEADER = Gauge("autostrm_leader", "Number of processes running the background loops (1 when healthy)")
+LEADER.set(0)
+
+
+def instrument(app: Flask) -> None:
+    """Time every request, labelled by its URL rule rather than the raw path."""
+    REGISTRY.start_flusher()
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe(resp):
+        start = getattr(g, "_metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            HTTP_LATENCY.observe(time.perf_counter() - start, route=route, method=request.method, status=resp.status_code)
+        return resp
+
+
+@metrics_api.route("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
@@ -22,7 +22,7 @@ class Job:
     name: str
     category: str
     input_type: str  # magnet|torrent
-    input_value: str
+    input_value: str  # magnet URI, or path of the stored .torrent file
     torbox_task_id: str | None
     state: str
     progress: float
@@ -31,12 +31,29 @@ class Job:
     eta: int
     dlspeed: int
     upspeed: int
+    tags: str = ""
+    info_hash: str | None = None
+    torbox_torrent_id: int | None = None
+    torbox_task_kind: str | None = None  # what torbox_task_id is: "torrent", "queued" or "hash"
+    as_queued: bool = False  # submit with TorBox's as_queued (uncached grab under the "queue" policy)
+    # submission outbox bookkeeping (see submitter.py)
+    submit_attempts: int = 0
+    next_submit_at: int = 0
+    error: str | None = None
+    notified_at: float | None = None  # last webhook notification (see webhook.py)
 
     @staticmethod
-    def new(name: str, category: str, input_type: str, input_value: str) -> "Job":
+    def new(name: str, category: str, input_type: str, input_value: str, tags: str = "", info_hash: str | None = None) -> "Job":
+        """
+        Jobs are keyed by the torrent's info hash, the same id Sonarr/Radarr know the
+        grab by. Only inputs whose hash cannot be derived fall back to a synthetic one.
+        """
         now = int(time.time())
-        seed = f"{name}-{category}-{now}-{input_type}".encode("utf-8")
-        h = hashlib.sha1(seed).hexdigest()
+        if info_hash:
+            h = info_hash.lower()
+        else:
+            seed = f"{name}-{category}-{now}-{input_type}".encode("utf-8")
+            h = hashlib.sha1(seed).hexdigest()
         return Job(
             hash=h,
             name=name,
@@ -51,6 +68,8 @@ class Job:
             eta=-1,
             dlspeed=0,
             upspeed=0,
+            tags=tags,
+            info_hash=info_hash.lower() if info_hash else None,
         )
 
     def to_dict(self) -> dict:
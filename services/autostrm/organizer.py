@@ -1,10 +1,8 @@
 import os
-import re
+from collections import Counter
 from dataclasses import dataclass
 from config import cfg
-
-
-TV_PATTERN = re.compile(r"(.*?)[ ._-]*S(\d{1,2})E(\d{1,2})", re.IGNORECASE)
+from release_parser import ParsedRelease, clean_title, parse_path, parse_release
 
 
 @dataclass
@@ -16,51 +14,61 @@ class MediaOrganizer:
             return cfg.MEDIA_MOVIES_PATH
         return cfg.MEDIA_MOVIES_PATH
 
+    def _is_tv(self, category: str, release: ParsedRelease, files: list[ParsedRelease]) -> bool:
+        if category in (cfg.CATEGORY_TV, cfg.CATEGORY_MOVIES):
+            return category == cfg.CATEGORY_TV
+        return release.is_tv or any(f.is_episode for f in files)
+
     def build_output_path(self, job: dict, file_rel_path: str) -> str:
+        return self.build_output_paths(job, [file_rel_path])[0]
+
+    def build_output_paths(self, job: dict, file_rel_paths: list[str]) -> list[str]:
         """
-        Build final .strm path per rules:
-        - TV: /data/media/tv/{Show Name}/Season {number}/{Show.Name.SxxEyy}.strm
-        - Movies: /data/media/movies/{Movie Name (Year)}/{Movie.Name.(Year)}.strm
+        Map every file of a job to its .strm path in one pass:
+        - TV: /data/media/tv/{Show Name}/Season {nn}/{Show Name} S{nn}E{nn}[E{nn}].strm
+          (absolute-numbered anime: /data/media/tv/{Show Name}/{Show Name} - {nnn}.strm)
+        - Movies: /data/media/movies/{Movie Name (Year)}/{Movie Name (Year)}.strm
+
+        Season and episode come from each file's own path, so a season pack fans
+        out to one file per episode; the job name supplies the show/movie title.
+        Paths that would still collide get the source file name appended.
         """
         category = job.get("category", cfg.CATEGORY_MOVIES)
         name = job.get("name", "Unknown")
-        base_dir = self.get_save_path_for_category(category)
+        release = parse_release(name)
+        parsed_files = [parse_path(rel) for rel in file_rel_paths]
+        tv = self._is_tv(category, release, parsed_files)
+        base_dir = cfg.MEDIA_TV_PATH if tv else self.get_save_path_for_category(category)
 
-        if category == cfg.CATEGORY_TV:
-            m = TV_PATTERN.search(name) or TV_PATTERN.search(file_rel_path)
-            show = name
-            season_num = 1
-            episode_num = 1
-            if m:
-                show = m.group(1).strip(" ._-")
-                try:
-                    season_num = int(m.group(2))
-                    episode_num = int(m.group(3))
-                except Exception:
-                    pass
-            show_dir = os.path.join(base_dir, show)
-            season_dir = os.path.join(show_dir, f"Season {season_num:02d}")
-            os.makedirs(season_dir, exist_ok=True)
-            out_name = re.sub(r"[^A-Za-z0-9._ -]", "", name)
-            if not TV_PATTERN.search(out_name):
-                out_name = f"{show}.S{season_num:02d}E{episode_num:02d}"
-            out_path = os.path.join(season_dir, f"{out_name}.strm")
-            return out_path
+        title = release.title or clean_title(name) or "Unknown"
+        if release.year:
+            title = f"{title} ({release.year})"
+        single = len(file_rel_paths) == 1
+
+        out_paths = []
+        for rel, parsed in zip(file_rel_paths, parsed_files):
+            if not tv:
+                out_paths.append(os.path.join(base_dir, title, f"{title}.strm"))
+                continue
+            episodes = parsed.episodes or (release.episodes if single else ())
+            if parsed.absolute and not episodes:
+                out_paths.append(os.path.join(base_dir, title, f"{title} - {parsed.absolute[0]:03d}.strm"))
+                continue
+            season = parsed.season if parsed.season is not None else (release.season if release.season is not None else 1)
+            season_dir = os.path.join(base_dir, title, f"Season {season:02d}")
+            if episodes:
+                tag = f"S{season:02d}" + "".join(f"E{e:02d}" for e in episodes)
+                out_paths.append(os.path.join(season_dir, f"{title} {tag}.strm"))
+            else:
+                out_paths.append(os.path.join(season_dir, f"{self._stem(rel) or title}.strm"))
 
-        # Movies
-        m = re.search(r"(.*?)[ ._-]*\(?((19|20)\d{2})\)?", name)
-        if m:
-            title = m.group(1).strip(" ._-")
-            year = m.group(2)
-            dir_name = f"{title} ({year})"
-            out_base = os.path.join(base_dir, dir_name)
-            os.makedirs(out_base, exist_ok=True)
-            file_name = f"{title} ({year}).strm"
-        else:
-            title = re.sub(r"[._]", " ", name).strip()
-            out_base = os.path.join(base_dir, title)
-            os.makedirs(out_base, exist_ok=True)
-            file_name = f"{title}.strm"
+        counts = Counter(out_paths)
+        for i, (path, rel) in enumerate(zip(out_paths, file_rel_paths)):
+            if counts[path] > 1:
+                root, ext = os.path.splitext(path)
+                out_paths[i] = f"{root} - {self._stem(rel)}{ext}"
+        return out_paths
 
-        out_path = os.path.join(out_base, file_name)
-        return out_path
\ No newline at end of file
+    @staticmethod
+    def _stem(file_rel_path: str) -> str:
+        return clean_title(os.path.splitext(os.path.basename(file_rel_path))[0])
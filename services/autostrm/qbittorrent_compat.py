@@ -1,13 +1,21 @@
+import json
+import os
 import time
-import re
 import secrets
 from urllib.parse import parse_qs, urlparse, unquote
-from flask import Blueprint, request, jsonify, make_response, session, render_template
-from config import cfg, state_store, categories_store
+from flask import Blueprint, Response, request, jsonify, make_response, session, render_template
+from config import cfg, state_store, categories_store, TORRENTS_DIR
 from models import Job, JobState
 from torbox_client import TorBoxClient
-from strm_generator import generate_strm_files
+from strm_generator import generate_strm_files, remove_strm_files
+from stream_redirect import resolver
 from organizer import MediaOrganizer
+from snapshot import DeltaJournal, JobSnapshot
+from infohash import magnet_info_hash, parse_torrent
+from availability import AvailabilityCache
+from release_parser import parse_release
+import submitter
+import worker
 
 qb_api = Blueprint("qb_api", __name__)
 web_ui = Blueprint("web_ui", __name__)
@@ -114,15 +122,25 @@ def app_preferences():
 def torrents_categories():
     if not _require_auth():
         return _auth_required_response()
-    cats = categories_store.load()
-    # qBittorrent returns a dict of {name: {name, savePath}}
-    result = {}
-    for name, meta in cats.items():
-        result[name] = {
-            "name": name,
-            "savePath": meta.get("savePath", organizer.get_save_path_for_category(name))
-        }
-    return jsonify(result)
+    return jsonify(_categories_payload())
+
+
+_categories_cache: tuple[int, dict] = (-1, {})
+
+
+def _categories_payload() -> dict:
+    # qBittorrent returns a dict of {name: {name, savePath}}; rebuilt only when categories.json changes
+    global _categories_cache
+    version = categories_store.version()
+    if _categories_cache[0] != version:
+        result = {}
+        for name, meta in categories_store.load().items():
+            result[name] = {
+                "name": name,
+                "savePath": meta.get("savePath", organizer.get_save_path_for_category(name))
+            }
+        _categories_cache = (version, result)
+    return _categories_cache[1]
 
 
 @qb_api.route("/torrents/createCategory", methods=["POST"])
@@ -153,7 +171,7 @@ def _magnet_display_name(magnet: str) -> str:
 def _guess_category(cat: str | None, name: str) -> str:
     if cat:
         return cat
-    if re.search(r"S\d{2}E\d{2}", name, re.IGNORECASE):
+    if parse_release(name).is_tv:
         return cfg.CATEGORY_TV
     return cfg.CATEGORY_MOVIES
 
@@ -168,36 +186,64 @@ def torrents_add():
     upload = request.files.get("torrents")  # .torrent file
     tags = request.form.get("tags", "")
 
-    jobs = state_store.load_jobs()
-    created_any = False
+    jobs = {}
+    known = snapshot.get().jobs
 
+    def _is_duplicate(h: str) -> bool:
+        # re-grabs of a live job are no-ops; deleted and failed jobs are replaced
+        # by a fresh job, so Sonarr/Radarr can retry a release after a failure
+        j = jobs.get(h) or known.get(h)
+        return bool(j) and j.get("state") not in (JobState.DELETED.value, JobState.ERROR.value)
+
+    # Jobs are persisted as QUEUED and handed to the submitter outbox; the request
+    # returns without waiting for TorBox.
     if urls:
         for line in urls.splitlines():
             line = line.strip()
             if not line:
                 continue
+            info_hash = magnet_info_hash(line)
+            if info_hash and _is_duplicate(info_hash):
+                continue
             name = _magnet_display_name(line)
             cat = _guess_category(category, name)
-            job = Job.new(name=name, category=cat, input_type="magnet", input_value=line)
-            task_id = client.submit_magnet(line, name=name, category=cat, tags=tags)
-            job.torbox_task_id = task_id
+            job = Job.new(name=name, category=cat, input_type="magnet", input_value=line, tags=tags, info_hash=info_hash)
             jobs[job.hash] = job.to_dict()
-            created_any = True
 
     if upload:
         data = upload.read()
-        name = upload.filename or "torrent.torrent"
-        cat = _guess_category(category, name)
-        job = Job.new(name=name, category=cat, input_type="torrent", input_value="")
-        task_id = client.submit_torrent_file(data, name=name, category=cat, tags=tags)
-        job.torbox_task_id = task_id
-        jobs[job.hash] = job.to_dict()
-        created_any = True
-
-    if not created_any:
+        info_hash, torrent_name = parse_torrent(data)
+        if not (info_hash and _is_duplicate(info_hash)):
+            name = torrent_name or upload.filename or "torrent.torrent"
+            cat = _guess_category(category, name)
+            job = Job.new(name=name, category=cat, input_type="torrent", input_value="", tags=tags, info_hash=info_hash)
+            job.input_value = os.path.join(TORRENTS_DIR, f"{job.hash}.torrent")
+            with open(job.input_value, "wb") as f:
+                f.write(data)
+            jobs[job.hash] = job.to_dict()
+
+    if not jobs:
+        if urls or upload:
+            return "Ok."  # everything was already known
         return make_response("No torrents to add", 400)
 
-    state_store.save_jobs(jobs)
+    policy = cfg.uncached_policy
+    if policy != "submit":
+        cached = availability.check(j["info_hash"] for j in jobs.values() if j.get("info_hash"))
+        for h, j in list(jobs.items()):
+            if cached.get(j.get("info_hash") or "") is not False:
+                continue  # cached, or unknown (no hash / lookup failed): submit normally
+            if policy == "reject":
+                del jobs[h]
+            else:
+                j["as_queued"] = True
+        if not jobs:
+            # qBittorrent's failure answer: Sonarr/Radarr move on to the next release
+            return "Fails."
+
+    state_store.put_jobs(jobs.values())
+    submitter.wake()
+    worker.wake()
     return "Ok."
 
 
@@ -215,34 +261,144 @@ def _map_state(job_state: str) -> str:
     return mapping.get(job_state, "unknown")
 
 
+def _torrent_info(h: str, j: dict) -> dict:
+    progress = j.get("progress", 0.0)
+    size = int(j.get("size", 0))
+    eta = j.get("eta", -1)
+    category = j.get("category", "")
+    return {
+        "hash": h,
+        "name": j.get("name"),
+        "progress": progress,
+        "state": _map_state(j.get("state")),
+        "added_on": j.get("added_on"),
+        "save_path": organizer.get_save_path_for_category(category),
+        "category": category,
+        "tags": j.get("tags") or "",
+        "eta": eta if isinstance(eta, int) else -1,
+        "dlspeed": j.get("dlspeed", 0),
+        "upspeed": j.get("upspeed", 0),
+        "size": size,
+        "downloaded": int(progress * size),
+    }
+
+
+def _tag_keys(t: dict) -> list[str]:
+    return [tag.strip() for tag in t["tags"].split(",") if tag.strip()] or [""]
+
+
+snapshot = JobSnapshot(_torrent_info, indexes={
+    "category": lambda t: (t["category"] or "",),
+    "state": lambda t: (t["state"],),
+    "tag": _tag_keys,
+})
+journal = DeltaJournal(snapshot)
+availability = AvailabilityCache(lambda hashes: client.check_cached(hashes, timeout=cfg.availability_timeout),
+                                 ttl=cfg.availability_ttl)
+
+
+def _etag_response(body: str, etag: str) -> Response:
+    resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    return resp.make_conditional(request)
+
+
+# qBittorrent's torrents/info filters, as sets of the states _map_state produces;
+# the _EXCLUDING ones match every state outside the set
+_ACTIVE = {"downloading", "uploading"}
+_PAUSED = {"pausedDL", "pausedUP"}
+_FILTERS = {
+    "downloading": {"downloading", "queuedDL", "stalledDL", "pausedDL"},
+    "seeding": {"uploading"},
+    "completed": {"uploading", "pausedUP"},
+    "paused": _PAUSED,
+    "stopped": _PAUSED,
+    "active": _ACTIVE,
+    "stalled": {"stalledDL"},
+    "stalled_downloading": {"stalledDL"},
+    "stalled_uploading": set(),
+    "checking": set(),
+    "errored": {"error", "missingFiles"},
+}
+_FILTERS_EXCLUDING = {"resumed": _PAUSED, "running": _PAUSED, "inactive": _ACTIVE}
+
+
+def _int_arg(name: str) -> int | None:
+    value = request.args.get(name)
+    if value in (None, ""):
+        return None
+    return int(value)
+
+
+def _select(snap, filter_: str, category: str | None, tag: str | None, hashes: str | None) -> list[str]:
+    """
+    Hashes matching the query, narrowed through the indexes (smallest set first)
+    so the work done is proportional to the candidates, not to all jobs.
+    """
+    candidates: list[set] = []
+    if hashes is not None:
+        candidates.append({h.strip().lower() for h in hashes.split("|") if h.strip()})
+    if category is not None:
+        candidates.append(snapshot.lookup("category", category))
+    if tag is not None:
+        candidates.append(snapshot.lookup("tag", tag))
+    if filter_ in _FILTERS:
+        candidates.append(set().union(*(snapshot.lookup("state", st) for st in _FILTERS[filter_])))
+    excluded = _FILTERS_EXCLUDING.get(filter_, set())
+
+    if not candidates:
+        selected = list(snap.torrents)
+    else:
+        candidates.sort(key=len)
+        selected = [h for h in candidates[0] if all(h in c for c in candidates[1:])]
+
+    # indexes can be ahead of the snapshot we hold: re-check against it
+    rows = []
+    for h in selected:
+        t = snap.torrents.get(h)
+        if t is None or t["state"] in excluded:
+            continue
+        if category is not None and (t["category"] or "") != category:
+            continue
+        if tag is not None and tag not in _tag_keys(t):
+            continue
+        if filter_ in _FILTERS and t["state"] not in _FILTERS[filter_]:
+            continue
+        rows.append(h)
+    return rows
+
+
 @qb_api.route("/torrents/info", methods=["GET"])
 def torrents_info():
     if not _require_auth():
         return _auth_required_response()
-    jobs = state_store.load_jobs()
-    result = []
-    for h, j in jobs.items():
-        progress = j.get("progress", 0.0)
-        size = int(j.get("size", 0))
-        downloaded = int(progress * size)
-        eta = j.get("eta", -1)
-        category = j.get("category", "")
-        save_path = organizer.get_save_path_for_category(category)
-        result.append({
-            "hash": h,
-            "name": j.get("name"),
-            "progress": progress,
-            "state": _map_state(j.get("state")),
-            "added_on": j.get("added_on"),
-            "save_path": save_path,
-            "category": category,
-            "eta": eta if isinstance(eta, int) else -1,
-            "dlspeed": j.get("dlspeed", 0),
-            "upspeed": j.get("upspeed", 0),
-            "size": size,
-            "downloaded": downloaded,
-        })
-    return jsonify(result)
+    args = request.args
+    if not any(k in args for k in ("filter", "category", "tag", "sort", "reverse", "limit", "offset", "hashes")):
+        snap, body = snapshot.derived("torrents_info", lambda s: "[" + ",".join(s.encoded.values()) + "]")
+        return _etag_response(body, snap.etag)
+
+    try:
+        limit, offset = _int_arg("limit"), _int_arg("offset")
+    except ValueError:
+        return make_response("Bad Request", 400)
+    snap = snapshot.get()
+    selected = _select(snap, args.get("filter", "all"), args.get("category"), args.get("tag"), args.get("hashes"))
+
+    sort = args.get("sort")
+    reverse = args.get("reverse", "false").lower() == "true"
+    if sort:
+        def sort_key(h: str):
+            value = snap.torrents[h].get(sort)
+            return (value is not None, value if value is not None else 0)  # missing values sort first
+        selected.sort(key=sort_key, reverse=reverse)
+    else:
+        # index lookups come back unordered; keep pages stable across calls
+        selected.sort(key=lambda h: (snap.torrents[h].get("added_on") or 0, h), reverse=reverse)
+    if offset:
+        selected = selected[offset:] if offset > 0 else selected[max(0, len(selected) + offset):]
+    if limit and limit > 0:
+        selected = selected[:limit]
+    return _etag_response("[" + ",".join(snap.encoded[h] for h in selected) + "]", snap.etag)
 
 
 @qb_api.route("/torrents/delete", methods=["POST"])
@@ -250,24 +406,30 @@ def torrents_delete():
     if not _require_auth():
         return _auth_required_response()
     hashes = request.form.get("hashes", "")
-    _delete_files = request.form.get("deleteFiles", "false").lower() == "true"
-    jobs = state_store.load_jobs()
+    delete_files = request.form.get("deleteFiles", "false").lower() == "true"
+    changes = {}
+    known = snapshot.get().jobs
     for h in hashes.split("|"):
-        h = h.strip()
+        h = h.strip().lower()
         if not h:
             continue
-        j = jobs.get(h)
+        j = known.get(h)
         if not j:
             continue
-        task_id = j.get("torbox_task_id")
-        if task_id:
+        # the worker records TorBox's torrent id on the job, so usually no mylist
+        # lookup is needed; jobs still queued on TorBox are removed from the queue
+        if j.get("torbox_task_id") or j.get("torbox_torrent_id") is not None:
             try:
-                client.cancel_task(task_id)
+                client.cancel_task(TorBoxClient.task_ref(j))
             except Exception:
                 pass
-        j["state"] = "deleted"
-        j["deleted_at"] = int(time.time())
-    state_store.save_jobs(jobs)
+        if j.get("torbox_torrent_id") is not None:
+            resolver.invalidate(int(j["torbox_torrent_id"]))
+        if delete_files:
+            # only the .strm files this job produced, as recorded in its manifest
+            remove_strm_files(h)
+        changes[h] = {"state": "deleted", "deleted_at": int(time.time())}
+    state_store.update_jobs(changes)
     return "Ok."
 
 
@@ -275,25 +437,118 @@ def torrents_delete():
 def sync_maindata():
     if not _require_auth():
         return _auth_required_response()
-    jobs = state_store.load_jobs()
-    torrents = {}
-    for h, j in jobs.items():
-        torrents[h] = {
-            "name": j.get("name"),
-            "progress": j.get("progress", 0.0),
-            "state": _map_state(j.get("state")),
-            "category": j.get("category"),
-        }
-    return jsonify({
-        "rid": int(time.time()),
-        "torrents": torrents,
-        "categories": list(categories_store.load().keys()),
-    })
+    try:
+        rid = int(request.args.get("rid", 0))
+    except ValueError:
+        rid = 0
+    return jsonify(journal.maindata(rid, _categories_payload()))
 
 
 # Web UI
+_DASHBOARD_PER_PAGE = 50
+_EVENTS_POLL = 1.0  # seconds between store version checks per open stream
+_EVENTS_KEEPALIVE = 15.0
+_EVENTS_MAX_AGE = 300.0  # streams end after this; EventSource reconnects on its own
+
+
+def _dashboard_row(h: str, j: dict) -> dict:
+    return {
+        "hash": h,
+        "name": j.get("name"),
+        "category": j.get("category", ""),
+        "state": j.get("state"),
+        "progress": round(float(j.get("progress") or 0.0) * 100, 1),
+        "added_on": j.get("added_on"),
+    }
+
+
+def _dashboard_matches(j: dict, state: str, category: str) -> bool:
+    return (not state or j.get("state") == state) and (not category or j.get("category", "") == category)
+
+
 @web_ui.route("/dashboard")
 def dashboard():
-    jobs = state_store.load_jobs()
-    sorted_jobs = sorted(jobs.values(), key=lambda j: j.get("added_on", 0), reverse=True)
-    return render_template("index.html", jobs=sorted_jobs, cfg=cfg)
\ No newline at end of file
+    state = request.args.get("state", "")
+    category = request.args.get("category", "")
+    try:
+        page = max(1, _int_arg("page") or 1)
+        per_page = max(1, min(500, _int_arg("per_page") or _DASHBOARD_PER_PAGE))
+    except ValueError:
+        page, per_page = 1, _DASHBOARD_PER_PAGE
+
+    snap, order = snapshot.derived(
+        "dashboard", lambda s: sorted(s.jobs, key=lambda h: (s.jobs[h].get("added_on") or 0, h), reverse=True)
+    )
+    if state or category:
+        # job states map one-to-one onto qBittorrent states, so the snapshot's index serves both
+        selected = snapshot.lookup("state", _map_state(state)) if state else None
+        if category:
+            in_category = snapshot.lookup("category", category)
+            selected = in_category if selected is None else selected & in_category
+        order = [h for h in order if h in selected]
+    total = len(order)
+    pages = max(1, -(-total // per_page))
+    page = min(page, pages)
+    jobs = [_dashboard_row(h, snap.jobs[h]) for h in order[(page - 1) * per_page:page * per_page]]
+
+    query = request.args.get("q", "").strip()
+    archived_total, archived = state_store.search_archive(query, limit=50)
+    return render_template("index.html", jobs=jobs, cfg=cfg, total=total, page=page, pages=pages, per_page=per_page,
+                           state=state, category=category, states=[s.value for s in JobState],
+                           categories=sorted(_categories_payload()), version=snap.version,
+                           query=query, archived=archived, archived_total=archived_total)
+
+
+@web_ui.route("/dashboard/events")
+def dashboard_events():
+    """
+    Server-sent events for an open dashboard: one "delta" event per store version
+    with the rows that changed (matching the page's filters) and the hashes that
+    were removed or stopped matching.
+
+    Every event carries the store version as its id. A stream resumes from
+    Last-Event-ID when EventSource reconnects, else from ?since= (the version
+    the page was rendered at), so no change in between is missed.
+    """
+    state = request.args.get("state", "")
+    category = request.args.get("category", "")
+    since = None
+    for value in (request.headers.get("Last-Event-ID"), request.args.get("since")):
+        try:
+            since = int(value)
+            break
+        except (TypeError, ValueError):
+            continue
+
+    def stream():
+        snap = snapshot.get()
+        version = snap.version if since is None else since
+        yield f"retry: 3000\nid: {version}\nevent: version\ndata: {snap.version}\n\n"
+        started = last_sent = time.time()
+        while time.time() - started < _EVENTS_MAX_AGE:
+            delta = snapshot.changes_since(version)
+            if delta is None:
+                # removals since our version are unknown: let the page reload itself
+                yield "event: reload\ndata: {}\n\n"
+                return
+            current, changed, gone = delta
+            if current.version == version:
+                if time.time() - last_sent >= _EVENTS_KEEPALIVE:
+                    last_sent = time.time()
+                    yield ": keepalive\n\n"
+                time.sleep(_EVENTS_POLL)
+                continue
+            rows, removed = [], list(gone)
+            for h in changed:
+                j = current.jobs[h]
+                if _dashboard_matches(j, state, category):
+                    rows.append(_dashboard_row(h, j))
+                else:
+                    removed.append(h)
+            version, last_sent = current.version, time.time()
+            if rows or removed:
+                data = json.dumps({"version": current.version, "jobs": rows, "removed": removed}, separators=(",", ":"))
+                yield f"id: {current.version}\nevent: delta\ndata: {data}\n\n"
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
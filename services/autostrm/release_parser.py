@@ -0,0 +1,185 @@
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+# All patterns are compiled once; parse_release() is memoized per name, so a
+# season pack's files and repeated worker passes cost one regex run per string.
+_GROUP_PREFIX = re.compile(r"^\s*\[[^\]]*\]\s*")
+_SXXEYY = re.compile(
+    # further episodes need an explicit E or a "-" range (E02, -E03, -03), and a
+    # bare range number followed by bit/ch/.1 is a bit depth or channel layout
+    r"\bS(?P<season>\d{1,2})[ ._-]?E(?P<ep>\d{1,3})"
+    r"(?P<more>(?:[ ._-]?E\d{1,3}(?!\d|p\b)|[ ._]?-[ ._]?\d{1,3}(?!\d|p\b|bit|ch\b|[.,]\d(?!\d)))*)",
+    re.IGNORECASE,
+)
+_MORE_EPISODES = re.compile(r"(-)?[ ._-]?E?(\d{1,3})", re.IGNORECASE)
+_NXNN = re.compile(r"(?<![\dA-Za-z])(?P<season>\d{1,2})x(?P<ep>\d{2,3})(?:[-x](?P<ep2>\d{2,3}))?\b", re.IGNORECASE)
+_SEASON_PACK = re.compile(
+    r"\b(?:S(?P<s>\d{1,2})(?:[ ._-]?-[ ._-]?S?\d{1,2})?|Season[ ._-]?(?P<season>\d{1,2}))\b(?![ ._-]?E\d)",
+    re.IGNORECASE,
+)
+_BARE_EPISODE = re.compile(r"\b(?:E|Ep|Episode)[ ._-]?(?P<ep>\d{1,3})\b", re.IGNORECASE)
+_LEADING_NUMBER = re.compile(r"^(?P<ep>\d{1,3})(?!\d)")
+_ABSOLUTE = re.compile(r"[ ._]-[ ._](?P<abs>\d{2,4})(?:v\d)?(?=[ ._\[(]|$)")
+_YEAR = re.compile(r"(?<!\d)[(\[]?(?P<year>19\d{2}|20\d{2})[)\]]?(?!\d)")
+_RESOLUTION = re.compile(r"\b(2160p|1080p|720p|576p|480p|4k|uhd)\b", re.IGNORECASE)
+_TAGS = re.compile(
+    r"\b(web[ ._-]?dl|webrip|bluray|blu[ ._-]?ray|remux|hdtv|dvdrip|hdr10\+?|hdr10plus|hdr|dv|dovi|"
+    r"hevc|x265|x264|h[ ._]?26[45]|av1|imax|repack|proper)\b",
+    re.IGNORECASE,
+)
+_BRACKETED = re.compile(r"\[[^\]]*\]|\([^)]*\)|\{[^}]*\}")
+_SEPARATORS = re.compile(r"[._]+")
+_SPACES = re.compile(r"\s{2,}")
+_UNSAFE = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+MEDIA_EXTENSIONS = (".mkv", ".mp4", ".avi", ".mov", ".m4v", ".wmv", ".ts", ".webm")
+
+
+@dataclass(frozen=True)
+class ParsedRelease:
+    title: str
+    year: int | None = None
+    season: int | None = None
+    episodes: tuple[int, ...] = ()
+    absolute: tuple[int, ...] = ()
+    resolution: str | None = None
+    tags: tuple[str, ...] = ()
+
+    @property
+    def is_episode(self) -> bool:
+        return bool(self.episodes or self.absolute)
+
+    @property
+    def is_season_pack(self) -> bool:
+        return self.season is not None and not self.episodes
+
+    @property
+    def is_tv(self) -> bool:
+        return self.is_episode or self.season is not None
+
+
+def clean_title(raw: str) -> str:
+    title = _SEPARATORS.sub(" ", _BRACKETED.sub(" ", raw))
+    title = _UNSAFE.sub("", title)
+    return _SPACES.sub(" ", title).strip(" -[](){}")
+
+
+def _strip_extension(name: str) -> str:
+    root, ext = os.path.splitext(name)
+    return root if ext.lower() in MEDIA_EXTENSIONS or ext.lower() in (".strm", ".torrent") else name
+
+
+@lru_cache(maxsize=16384)
+def parse_release(name: str) -> ParsedRelease:
+    """
+    Parse a release or file name: SxxEyy (incl. S01E01E02 / S01E01-E03), 1x02,
+    season packs (S01, S01-S03, Season 1), absolute anime numbering
+    ("[Group] Show - 012"), year, resolution and common quality tags.
+    """
+    base = _strip_extension(os.path.basename(name.rstrip("/\\")) or name)
+    text = _GROUP_PREFIX.sub("", base)
+    cut = len(text)
+    season = None
+    episodes: tuple[int, ...] = ()
+    absolute: tuple[int, ...] = ()
+
+    m = _SXXEYY.search(text)
+    if m:
+        season = int(m.group("season"))
+        eps = [int(m.group("ep"))]
+        for rng, num in _MORE_EPISODES.findall(m.group("more") or ""):
+            n = int(num)
+            if rng and n > eps[-1]:
+                eps.extend(range(eps[-1] + 1, n + 1))
+            elif n > eps[-1]:
+                eps.append(n)
+        episodes = tuple(eps)
+        cut = m.start()
+    else:
+        m = _NXNN.search(text)
+        if m:
+            season = int(m.group("season"))
+            first = int(m.group("ep"))
+            last = int(m.group("ep2")) if m.group("ep2") else first
+            episodes = tuple(range(first, max(first, last) + 1))
+            cut = m.start()
+        else:
+            m = _SEASON_PACK.search(text)
+            if m:
+                season = int(m.group("s") or m.group("season"))
+                cut = m.start()
+            em = _BARE_EPISODE.search(text, m.end() if m else 0)
+            if em:
+                episodes = (int(em.group("ep")),)
+                cut = min(cut, em.start())
+            elif not m:
+                m = _ABSOLUTE.search(text)
+                if m:
+                    absolute = (int(m.group("abs")),)
+                    cut = m.start()
+
+    for pattern in (_RESOLUTION, _TAGS):
+        tm = pattern.search(text)
+        if tm and tm.start() < cut:
+            cut = tm.start()
+
+    # the last year before the quality tags wins ("Blade Runner 2049 (2017)"); a
+    # leading year belongs to the title ("2001 A Space Odyssey 1968")
+    year = None
+    years = [y for y in _YEAR.finditer(text) if y.start() > 0]
+    before = [y for y in years if y.start() < cut]
+    if before:
+        year = int(before[-1].group("year"))
+        cut = before[-1].start()
+    elif years:
+        year = int(years[0].group("year"))
+
+    res = _RESOLUTION.search(text)
+    tags = tuple(dict.fromkeys(t.lower() for t in _TAGS.findall(text)))
+    title = clean_title(text[:cut])
+    if not title and season is None and not episodes and not absolute:
+        title = clean_title(text)
+    return ParsedRelease(
+        title=title,
+        year=year,
+        season=season,
+        episodes=episodes,
+        absolute=absolute,
+        resolution=res.group(1).lower() if res else None,
+        tags=tags,
+    )
+
+
+@lru_cache(maxsize=16384)
+def parse_path(path: str) -> ParsedRelease:
+    """
+    Parse a file path inside a torrent, letting the file name win and filling
+    season (and title) from enclosing folders such as "Show S02/Season 2/E05.mkv".
+    """
+    parts = [p for p in re.split(r"[\\/]+", path) if p]
+    if not parts:
+        return parse_release(path)
+    leaf = parse_release(parts[-1])
+    season, title, year = leaf.season, leaf.title, leaf.year
+    for folder in reversed(parts[:-1]):
+        if season is not None and title and year is not None:
+            break
+        p = parse_release(folder)
+        season = season if season is not None else p.season
+        year = year if year is not None else p.year
+        title = title or p.title
+    episodes = leaf.episodes
+    if season is not None and not leaf.is_episode:
+        # "Season 2/05 - Title.mkv"
+        m = _LEADING_NUMBER.match(_GROUP_PREFIX.sub("", os.path.basename(parts[-1])))
+        if m:
+            episodes = (int(m.group("ep")),)
+            title = next((parse_release(f).title for f in reversed(parts[:-1]) if parse_release(f).title), "")
+    if (season, title, year, episodes) == (leaf.season, leaf.title, leaf.year, leaf.episodes):
+        return leaf
+    return ParsedRelease(
+        title=title, year=year, season=season, episodes=episodes,
+        absolute=leaf.absolute, resolution=leaf.resolution, tags=leaf.tags,
+    )
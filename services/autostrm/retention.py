@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+from config import cfg, state_store
+from models import JobState
+from metrics import RETENTION_RESULTS
+
+log = logging.getLogger("retention")
+
+_retention_thread = None
+_retention_stop = False
+
+
+def _expired(job: dict, field: str, age: float, now: float) -> bool:
+    if age <= 0:
+        return False
+    since = job.get(field)
+    if since is None:
+        since = job.get("added_on", now)
+    return now - float(since) >= age
+
+
+def apply_retention(now: float | None = None) -> tuple[int, int]:
+    """
+    Apply the retention policies once and return (archived, dropped).
+
+    A deleted job that had finished was removed by Sonarr/Radarr after import and
+    is archived; one that never finished is dropped. DONE and ERROR jobs nobody
+    removed are archived once they are old enough, counted from when they
+    completed or failed.
+    """
+    now = now or time.time()
+    finished = state_store.load_jobs(states=(JobState.DONE.value, JobState.ERROR.value, JobState.DELETED.value))
+    archive, drop, stamp = [], [], {}
+    for h, j in finished.items():
+        state = j.get("state")
+        if state == JobState.DELETED.value:
+            if _expired(j, "deleted_at", cfg.retention_deleted, now):
+                (archive if j.get("completed_at") else drop).append(h)
+        elif state == JobState.DONE.value:
+            if _expired(j, "completed_at", cfg.retention_done, now):
+                archive.append(h)
+        elif j.get("errored_at") is None:
+            # failed before errored_at was recorded: start its retention now
+            stamp[h] = {"errored_at": int(now)}
+        elif _expired(j, "errored_at", cfg.retention_error, now):
+            archive.append(h)
+
+    state_store.update_jobs(stamp)
+    archived = state_store.archive_jobs(archive, now=int(now))
+    if drop:
+        state_store.delete_jobs(drop)
+    if archived or drop:
+        log.info("Retention: archived %d job(s), dropped %d", archived, len(drop))
+        RETENTION_RESULTS.inc(archived, outcome="archived")
+        RETENTION_RESULTS.inc(len(drop), outcome="dropped")
+    state_store.compact()
+    return archived, len(drop)
+
+
+def _retention_loop():
+    while not _retention_stop:
+        try:
+            apply_retention()
+        except Exception:
+            log.exception("Retention pass failed")
+        time.sleep(cfg.retention_interval)
+
+
+def start_retention():
+    global _retention_thread
+    if _retention_thread and _retention_thread.is_alive():
+        return
+    _retention_thread = threading.Thread(target=_retention_loop, name="autostrm-retention", daemon=True)
+    _retention_thread.start()
@@ -0,0 +1,225 @@
+import json
+import threading
+import zlib
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+from config import state_store
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    Immutable view of all jobs at one store version.
+    `torrents` holds the rendered qBittorrent dict per job and `encoded` its
+    serialized JSON, so unchanged jobs are never re-rendered or re-encoded.
+    """
+    version: int
+    jobs: dict = field(default_factory=dict)
+    torrents: dict = field(default_factory=dict)
+    encoded: dict = field(default_factory=dict)
+
+    @property
+    def etag(self) -> str:
+        return f"v{self.version}"
+
+
+class JobSnapshot:
+    """
+    Versioned in-process cache of the job table.
+
+    get() costs one version lookup when nothing changed; otherwise only jobs
+    written since the cached version are fetched and re-rendered.
+
+    `indexes` maps an index name to the keys a rendered job is filed under
+    (its category, state, tags). The hash sets are updated in place for the
+    changed jobs only; lookup() may run ahead of an older Snapshot, so callers
+    check candidates against the snapshot they hold.
+
+    The hashes changed and removed by each of the last `history` version steps
+    are kept too, so changes_since() can answer "what moved since version v"
+    without scanning every job.
+    """
+
+    def __init__(self, render: Callable[[str, dict], dict], indexes: dict[str, Callable[[dict], Iterable[str]]] | None = None,
+                 history: int = 256) -> None:
+        self._render = render
+        self._steps: deque = deque(maxlen=history)  # (from version, to version, changed, removed)
+        self._lock = threading.Lock()
+        self._current = Snapshot(version=-1)
+        self._derived: dict[str, object] = {}
+        self._index_keys = indexes or {}
+        self._indexes: dict[str, dict[str, set]] = {name: {} for name in self._index_keys}
+
+    def _reindex(self, h: str, old: dict | None, new: dict | None) -> None:
+        for name, keys in self._index_keys.items():
+            buckets = self._indexes[name]
+            old_keys = set(keys(old)) if old is not None else set()
+            new_keys = set(keys(new)) if new is not None else set()
+            for k in old_keys - new_keys:
+                bucket = buckets.get(k)
+                if bucket is not None:
+                    bucket.discard(h)
+                    if not bucket:
+                        del buckets[k]
+            for k in new_keys - old_keys:
+                buckets.setdefault(k, set()).add(h)
+
+    def lookup(self, index: str, key: str) -> set:
+        """Hashes filed under key in the named index (a copy)."""
+        self.get()
+        with self._lock:
+            return set(self._indexes[index].get(key, ()))
+
+    def get(self) -> Snapshot:
+        snap = self._current
+        if state_store.version() == snap.version:
+            return snap
+        with self._lock:
+            snap = self._current
+            version, changed, removed = state_store.changes_since(snap.version)
+            if version == snap.version:
+                return snap
+            jobs, torrents, encoded = dict(snap.jobs), dict(snap.torrents), dict(snap.encoded)
+            if removed is None:
+                # our version predates compacted tombstones: changed is the full table
+                removed = jobs.keys() - changed.keys()
+            for h in removed:
+                jobs.pop(h, None)
+                self._reindex(h, torrents.pop(h, None), None)
+                encoded.pop(h, None)
+            for h, j in changed.items():
+                jobs[h] = j
+                rendered = self._render(h, j)
+                self._reindex(h, torrents.get(h), rendered)
+                torrents[h] = rendered
+                encoded[h] = json.dumps(torrents[h], separators=(",", ":"))
+            self._steps.append((snap.version, version, frozenset(changed), frozenset(removed)))
+            self._current = Snapshot(version=version, jobs=jobs, torrents=torrents, encoded=encoded)
+            self._derived = {}
+            return self._current
+
+    def changes_since(self, version: int) -> tuple[Snapshot, set, set] | None:
+        """
+        (current snapshot, hashes changed, hashes removed) since `version`, or
+        None when removals since that version are no longer known.
+
+        Versions outside this process's history (one seen by another process, or
+        evicted) are answered from the store's revs and tombstones; the sets may
+        then include hashes that changed after the returned snapshot.
+        """
+        snap = self.get()
+        changed: set = set()
+        removed: set = set()
+        if version == snap.version:
+            return snap, changed, removed
+        with self._lock:
+            steps = [st for st in self._steps if st[0] >= version and st[1] <= snap.version]
+        if not steps or steps[0][0] != version:
+            # read after snap was taken, so nothing between version and snap is missed
+            _version, rows, gone = state_store.changes_since(version)
+            if gone is None:
+                return None
+            touched = rows.keys() | gone
+            changed = {h for h in touched if h in snap.jobs}
+            return snap, changed, touched - changed
+        for _from, _to, step_changed, step_removed in steps:
+            changed -= step_removed
+            removed -= step_changed
+            changed |= step_changed
+            removed |= step_removed
+        return snap, changed, removed
+
+    def derived(self, key: str, build: Callable[[Snapshot], object]) -> tuple[Snapshot, object]:
+        """
+        Memoize a value computed from the current snapshot (a response body,
+        a sorted list) until the next version change.
+        """
+        snap = self.get()
+        cached = self._derived.get(key)
+        if cached is not None and cached[0] == snap.version:
+            return snap, cached[1]
+        value = build(snap)
+        self._derived[key] = (snap.version, value)
+        return snap, value
+
+
+def _diff(old: dict, new: dict) -> tuple[dict, list]:
+    """Per-key field delta from old to new, plus keys that disappeared."""
+    changed = {}
+    for k, v in new.items():
+        prev = old.get(k)
+        if prev is v:
+            continue
+        if prev is None:
+            changed[k] = v
+            continue
+        fields = {f: fv for f, fv in v.items() if prev.get(f) != fv}
+        if fields:
+            changed[k] = fields
+    removed = [k for k in old if k not in new]
+    return changed, removed
+
+
+# a rid is (store version) * _RID_TAGS + (tag of the categories payload)
+_RID_TAGS = 1 << 16
+
+
+class DeltaJournal:
+    """
+    rid codec for qBittorrent's /sync/maindata.
+
+    A rid encodes the jobs' store version and a tag of the categories payload,
+    so any gunicorn process can answer a rid another one handed out: torrents
+    changed since that version come from JobSnapshot.changes_since (full objects
+    for changed hashes) and categories are diffed against the payload with that
+    tag, the last `size` of which are kept. A rid whose version or tag can no
+    longer be resolved gets a full_update.
+    """
+
+    def __init__(self, snapshots: JobSnapshot, size: int = 16) -> None:
+        self._snapshots = snapshots
+        self._size = size
+        self._lock = threading.Lock()
+        self._categories: "OrderedDict[int, dict]" = OrderedDict()
+
+    def _tag(self, categories: dict) -> int:
+        encoded = json.dumps(categories, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        tag = zlib.crc32(encoded) % (_RID_TAGS - 1) + 1  # never 0, so no rid is 0
+        with self._lock:
+            self._categories[tag] = categories
+            self._categories.move_to_end(tag)
+            while len(self._categories) > self._size:
+                self._categories.popitem(last=False)
+        return tag
+
+    def maindata(self, rid: int, categories: dict) -> dict:
+        tag = self._tag(categories)
+        delta, base_categories = None, None
+        if rid > 0:
+            version, base_tag = divmod(rid, _RID_TAGS)
+            with self._lock:
+                base_categories = self._categories.get(base_tag)
+            if base_categories is not None:
+                delta = self._snapshots.changes_since(version)
+        if delta is None:
+            snap = self._snapshots.get()
+            return {
+                "rid": snap.version * _RID_TAGS + tag,
+                "full_update": True,
+                "torrents": snap.torrents,
+                "categories": categories,
+                "server_state": {},
+            }
+        snap, changed, removed = delta
+        data: dict = {"rid": snap.version * _RID_TAGS + tag}
+        if changed:
+            data["torrents"] = {h: snap.torrents[h] for h in changed}
+        if removed:
+            data["torrents_removed"] = sorted(removed)
+        c_changed, c_removed = _diff(base_categories, categories)
+        if c_changed:
+            data["categories"] = c_changed
+        if c_removed:
+            data["categories_removed"] = c_removed
+        return data
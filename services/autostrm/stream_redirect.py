@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import Blueprint, redirect, make_response
+from config import cfg, state_store
+from torbox_client import TorBoxClient, TorBoxError
+from link_refresher import link_expiry
+
+strm_api = Blueprint("strm_api", __name__)
+client = TorBoxClient()
+
+
+def strm_target(job_hash: str, file_id: int | str) -> str:
+    """Stable URL written into .strm files in redirect mode."""
+    return f"{cfg.public_url}/strm/{job_hash}/{file_id}"
+
+
+class StreamResolver:
+    """
+    Expiry-aware LRU of resolved TorBox stream links, keyed by (torrent_id, file_id).
+
+    Links are resolved on first play only. Entries are dropped `margin` seconds
+    before they expire so a player never receives a link about to go stale, and
+    concurrent requests for the same file share one resolution.
+    """
+
+    def __init__(self, resolve, capacity: int = 2048, ttl: float = 3600.0, margin: float = 60.0) -> None:
+        self._resolve = resolve
+        self.capacity = capacity
+        self.ttl = ttl
+        self.margin = margin
+        self._entries: "OrderedDict[tuple, tuple[str, float]]" = OrderedDict()
+        self._inflight: dict[tuple, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def _expiry(self, url: str) -> float:
+        return link_expiry(url, self.ttl)
+
+    def get(self, torrent_id: int, file_id: int) -> str | None:
+        key = (torrent_id, file_id)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and entry[1] - self.margin > time.time():
+                    self._entries.move_to_end(key)
+                    return entry[0]
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    self._inflight[key] = threading.Event()
+                    break
+            waiter.wait()
+            with self._lock:
+                if key not in self._entries:
+                    return None  # the shared resolution failed
+
+        try:
+            url = self._resolve(torrent_id, file_id)
+            if url:
+                with self._lock:
+                    self._entries[key] = (url, self._expiry(url))
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.capacity:
+                        self._entries.popitem(last=False)
+            return url
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
+    def invalidate(self, torrent_id: int, file_id: int | None = None) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == torrent_id and (file_id is None or k[1] == file_id)]:
+                del self._entries[key]
+
+
+resolver = StreamResolver(client.get_stream_url, ttl=cfg.strm_link_ttl)
+
+
+@strm_api.route("/strm/<job_hash>/<int:file_id>", methods=["GET", "HEAD"])
+def strm_redirect(job_hash: str, file_id: int):
+    # archived jobs keep their .strm files playable
+    job = state_store.get_job(job_hash.lower()) or state_store.get_archived(job_hash.lower())
+    if not job:
+        return make_response("Unknown job", 404)
+    torrent_id = job.get("torbox_torrent_id")
+    if job.get("state") == "deleted":
+        # its torrent is gone from TorBox: drop links this process still caches
+        if torrent_id is not None:
+            resolver.invalidate(int(torrent_id))
+        return make_response("Unknown job", 404)
+    if torrent_id is None:
+        return make_response("Job has no TorBox torrent yet", 404)
+    try:
+        url = resolver.get(int(torrent_id), file_id)
+    except TorBoxError as e:
+        return make_response(f"Stream resolution failed: {e}", 502)
+    if not url:
+        return make_response("No stream available", 502)
+    return redirect(url, code=302)
@@ -1,33 +1,147 @@
 import os
+import tempfile
+import threading
 from typing import List, Dict
-from config import cfg
+from config import cfg, state_store
 from organizer import MediaOrganizer
+from link_refresher import link_expiry, refresher
 
+# Directories known to exist, so repeated writes into a season folder skip makedirs.
+_known_dirs: set[str] = set()
+_dirs_lock = threading.Lock()
 
-def write_text_file(path: str, content: str) -> None:
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(content)
+
+def _needs_chown() -> bool:
+    # The entrypoint already drops to PUID:PGID, in which case every file we
+    # create has the right owner and chown is pure overhead.
+    try:
+        return (os.geteuid(), os.getegid()) != (cfg.puid, cfg.pgid)
+    except AttributeError:
+        return False
+
+
+def _chown(paths: List[str]) -> None:
     # Apply permissions (best-effort)
+    for p in paths:
+        try:
+            os.chown(p, cfg.puid, cfg.pgid)
+        except Exception:
+            pass
+
+
+def _ensure_dir(path: str) -> None:
+    if path in _known_dirs:
+        return
+    created = []
+    d = path
+    while d and not os.path.isdir(d):
+        created.append(d)
+        d = os.path.dirname(d)
+    os.makedirs(path, exist_ok=True)
+    if created and _needs_chown():
+        _chown(created)
+    with _dirs_lock:
+        _known_dirs.add(path)
+
+
+def write_text_file(path: str, content: str) -> bool:
+    """
+    Write content to path unless it already holds exactly that. The new content
+    goes to a temp file in the same directory and is renamed over the target,
+    so a library scan never sees a half-written file. Returns True if written.
+    """
     try:
-        os.chown(path, cfg.puid, cfg.pgid)
-    except Exception:
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == content:
+                return False
+    except (OSError, UnicodeDecodeError):
         pass
+    directory = os.path.dirname(path)
+    _ensure_dir(directory)
+    try:
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    except FileNotFoundError:
+        # removed behind our back (e.g. the media server pruned it): recreate once
+        with _dirs_lock:
+            _known_dirs.discard(directory)
+        _ensure_dir(directory)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.chmod(tmp, 0o644)
+        if _needs_chown():
+            _chown([tmp])
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+def _remove_paths(paths: List[str]) -> List[str]:
+    """
+    Delete files and prune directories left empty, up to the media roots.
+    Returns the paths that are gone; files that could not be deleted stay in
+    the manifest.
+    """
+    roots = {os.path.abspath(cfg.MEDIA_TV_PATH), os.path.abspath(cfg.MEDIA_MOVIES_PATH)}
+    removed = []
+    for p in paths:
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            continue
+        removed.append(p)
+        d = os.path.dirname(os.path.abspath(p))
+        while d not in roots and d != os.path.dirname(d):
+            try:
+                os.rmdir(d)
+            except OSError:
+                break
+            with _dirs_lock:
+                _known_dirs.discard(d)
+            d = os.path.dirname(d)
+    state_store.forget_strm_files(removed)
+    return removed
+
+
+def remove_strm_files(job_hash: str) -> List[str]:
+    """Delete every .strm file the manifest records for a job; returns those removed."""
+    return _remove_paths(state_store.strm_files_for(job_hash))
 
 
 def generate_strm_files(job: Dict, files: List[Dict]) -> List[str]:
     """
     Given a job and TorBox files [{path, size, stream_url}], create .strm files.
     Returns list of generated file paths.
+
+    Only files whose content changed are rewritten, and files a previous run
+    produced for this job but this one does not are removed (per-job manifest).
     """
     organizer = MediaOrganizer()
+    direct = cfg.strm_mode == "direct"
     out_paths = []
-    for f in files:
-        stream_url = f.get("stream_url")
-        if not stream_url:
-            continue
-        rel_path = f.get("path") or os.path.basename(stream_url)
-        out_file = organizer.build_output_path(job, rel_path)
+    manifest = []
+    files = [f for f in files if f.get("stream_url")]
+    targets = organizer.build_output_paths(job, [f.get("path") or os.path.basename(f["stream_url"]) for f in files])
+    for f, out_file in zip(files, targets):
+        stream_url = f["stream_url"]
         write_text_file(out_file, stream_url.strip() + "\n")
         out_paths.append(out_file)
-    return out_paths
\ No newline at end of file
+        # direct links go stale; remember when, so the refresher can rewrite just this file
+        expires_at = link_expiry(stream_url, cfg.strm_link_ttl) if direct else None
+        manifest.append((out_file, job.get("torbox_torrent_id"), f.get("id"), expires_at))
+    if job.get("hash"):
+        stale = set(state_store.strm_files_for(job["hash"])) - set(out_paths)
+        if stale:
+            _remove_paths(sorted(stale))
+        state_store.record_strm_files(job["hash"], manifest)
+        if direct:
+            refresher.track(job["hash"], manifest)
+    return out_paths
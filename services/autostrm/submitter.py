@@ -0,0 +1,111 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import state_store, cfg
+from models import JobState
+from torbox_client import TorBoxClient, TorBoxError
+import worker
+from metrics import SUBMIT_OUTBOX, SUBMIT_RESULTS
+
+log = logging.getLogger("submitter")
+
+_submitter_thread = None
+_submitter_stop = False
+_wake = threading.Event()
+
+
+def wake() -> None:
+    """Signal the submitter that new jobs were queued."""
+    _wake.set()
+
+
+def _outbox(now: int) -> dict:
+    """Jobs persisted by torrents/add that have not reached TorBox yet and are due."""
+    jobs = state_store.load_jobs(states=[JobState.QUEUED.value])
+    return {
+        h: j for h, j in jobs.items()
+        if not j.get("torbox_task_id") and int(j.get("next_submit_at") or 0) <= now
+    }
+
+
+def _submit(client: TorBoxClient, job: dict) -> dict:
+    """
+    Submit one outbox job and return the field changes to store.
+    HTTP 4xx answers (other than 429) are permanent and fail the job; anything
+    else is retried with capped exponential backoff, indefinitely.
+    """
+    name, cat, tags = job.get("name"), job.get("category"), job.get("tags", "")
+    as_queued = True if job.get("as_queued") else None
+    attempts = int(job.get("submit_attempts") or 0) + 1
+    try:
+        if job.get("input_type") == "torrent":
+            path = job.get("input_value") or ""
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError as e:
+                return {"state": JobState.ERROR.value, "error": f"torrent file unavailable: {e}", "submit_attempts": attempts}
+            kind, task_id = client.submit_torrent_file(data, name=name, category=cat, tags=tags, as_queued=as_queued)
+        else:
+            kind, task_id = client.submit_magnet(job.get("input_value"), name=name, category=cat, tags=tags, as_queued=as_queued)
+    except TorBoxError as e:
+        if e.status is not None and 400 <= e.status < 500 and e.status != 429:
+            return {"state": JobState.ERROR.value, "error": str(e), "submit_attempts": attempts}
+        delay = min(cfg.submit_retry_max, 5 * 2 ** (attempts - 1))
+        log.warning("Submission of %s failed (attempt %d), retrying in %ss: %s", job.get("hash"), attempts, delay, e)
+        return {"submit_attempts": attempts, "next_submit_at": int(time.time()) + delay, "error": str(e)}
+
+    if task_id is None:
+        return {"state": JobState.ERROR.value, "error": "TorBox returned no task id", "submit_attempts": attempts}
+    if job.get("input_type") == "torrent":
+        try:
+            os.remove(job.get("input_value"))
+        except OSError:
+            pass
+    return {"torbox_task_id": task_id, "torbox_task_kind": kind, "submit_attempts": attempts, "next_submit_at": 0, "error": None}
+
+
+def _drain_loop(idle_interval: int = 5):
+    client = TorBoxClient()
+    pool = ThreadPoolExecutor(max_workers=cfg.submit_concurrency, thread_name_prefix="autostrm-submit")
+
+    while not _submitter_stop:
+        try:
+            due = _outbox(int(time.time()))
+            SUBMIT_OUTBOX.set(len(due))
+            if due:
+                results = pool.map(lambda j: _submit(client, j), due.values())
+                changes = dict(zip(due.keys(), results))
+                for c in changes.values():
+                    if c.get("torbox_task_id"):
+                        SUBMIT_RESULTS.inc(outcome="submitted")
+                    elif c.get("state") == JobState.ERROR.value:
+                        c["errored_at"] = int(time.time())  # retention counts from here
+                        SUBMIT_RESULTS.inc(outcome="failed")
+                    else:
+                        SUBMIT_RESULTS.inc(outcome="retry")
+                for h in state_store.update_jobs(changes):
+                    # deleted while being submitted: don't leave the torrent on TorBox
+                    task_id = changes[h].get("torbox_task_id")
+                    if task_id:
+                        try:
+                            client.cancel_task(TorBoxClient.task_ref(dict(due[h], **changes[h])))
+                        except Exception:
+                            log.warning("Could not cancel TorBox task %s of deleted job %s", task_id, h)
+                if any(c.get("torbox_task_id") for c in changes.values()):
+                    worker.wake()  # first status check right away
+                continue
+        except Exception:
+            log.exception("Submitter cycle failed")
+        _wake.wait(idle_interval)
+        _wake.clear()
+
+
+def start_submitter():
+    global _submitter_thread
+    if _submitter_thread and _submitter_thread.is_alive():
+        return
+    _submitter_thread = threading.Thread(target=_drain_loop, name="autostrm-submitter", daemon=True)
+    _submitter_thread.start()
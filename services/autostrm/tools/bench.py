@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+AutoStrm benchmark
+Runs AutoStrm in-process against a fake TorBox API (tools/fake_torbox.py, in a
+subprocess) with N pre-seeded jobs, lets simulated Sonarr/Radarr clients poll
+torrents/info and sync/maindata, and reports request latency, worker cycle time,
+peak RSS and TorBox API calls per job.
+
+    python tools/bench.py --jobs 10000 --clients 8 --duration 30 --latency 0.05
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(HERE)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def start_fake_torbox(args) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    cmd = [sys.executable, os.path.join(HERE, "fake_torbox.py"), "--port", str(port), "--seed", str(args.jobs),
+           "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+           "--rate-429", str(args.rate_429), "--complete-after", str(args.complete_after), "--files", str(args.files)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(600):
+        try:
+            requests.get(f"{url}/_stats", timeout=1)
+            return proc, url
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.kill()
+    raise SystemExit("fake TorBox did not start")
+
+
+def seed_jobs(count: int) -> None:
+    sys.path.insert(0, HERE)
+    from fake_torbox import seed_torrent
+    from config import state_store
+    from models import Job, JobState
+
+    batch = []
+    for i in range(count):
+        tid, ih, name = seed_torrent(i)
+        job = Job.new(name, "tv", "magnet", f"magnet:?xt=urn:btih:{ih}&dn={name}", info_hash=ih).to_dict()
+        job.update(state=JobState.DOWNLOADING.value, torbox_task_id=tid, torbox_task_kind="torrent", added_on=int(time.time()) - count + i)
+        batch.append(job)
+        if len(batch) == 5000:
+            state_store.put_jobs(batch)
+            batch = []
+    state_store.put_jobs(batch)
+
+
+def poll_client(base: str, deadline: float, results: dict, lock: threading.Lock, etag: bool) -> None:
+    s = requests.Session()
+    s.post(f"{base}/api/v2/auth/login", data={"username": "autostrm", "password": "autostrm"})
+    rid, tag = 0, None
+    local = defaultdict(list)
+    errors = 0
+    while time.time() < deadline:
+        headers = {"If-None-Match": tag} if etag and tag else {}
+        start = time.perf_counter()
+        r = s.get(f"{base}/api/v2/torrents/info", headers=headers)
+        local["torrents/info"].append(time.perf_counter() - start)
+        errors += r.status_code >= 400
+        tag = r.headers.get("ETag", tag)
+
+        start = time.perf_counter()
+        r = s.get(f"{base}/api/v2/sync/maindata", params={"rid": rid})
+        local["sync/maindata"].append(time.perf_counter() - start)
+        errors += r.status_code >= 400
+        if r.ok:
+            rid = r.json().get("rid", rid)
+    with lock:
+        for k, v in local.items():
+            results[k].extend(v)
+        results["errors"].append(errors)
+
+
+def add_client(base: str, deadline: float, rate: float, results: dict, lock: threading.Lock) -> None:
+    s = requests.Session()
+    s.post(f"{base}/api/v2/auth/login", data={"username": "autostrm", "password": "autostrm"})
+    n = 0
+    while time.time() < deadline:
+        ih = hashlib.sha1(f"bench-add-{os.getpid()}-{n}".encode()).hexdigest()
+        start = time.perf_counter()
+        s.post(f"{base}/api/v2/torrents/add", data={"urls": f"magnet:?xt=urn:btih:{ih}&dn=Bench.Add.{n}", "category": "tv"})
+        with lock:
+            results["torrents/add"].append(time.perf_counter() - start)
+        n += 1
+        time.sleep(1.0 / rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AutoStrm against a fake TorBox API")
+    parser.add_argument('--jobs', type=int, default=1000, help='Pre-seeded jobs (1k-100k)')
+    parser.add_argument('--clients', type=int, default=4, help='Simulated Sonarr/Radarr pollers')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+    parser.add_argument('--add-rate', type=float, default=0.0, help='torrents/add calls per second')
+    parser.add_argument('--etag', action='store_true', help='Clients send If-None-Match on torrents/info')
+    parser.add_argument('--latency', type=float, default=0.02, help='Fake TorBox latency per call (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of TorBox calls answered with 503')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Fraction of TorBox calls answered with 429')
+    parser.add_argument('--complete-after', type=float, default=120.0, help='Seconds for a fake torrent to finish')
+    parser.add_argument('--files', type=int, default=1, help='Media files per torrent')
+    parser.add_argument('--torbox-rate', type=float, default=1000.0, help='TORBOX_RATE_PER_SEC for the client')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    fake, fake_url = start_fake_torbox(args)
+    workdir = tempfile.mkdtemp(prefix="autostrm-bench-")
+    os.environ.update({
+        "CONFIG_DIR": os.path.join(workdir, "config"),
+        "MEDIA_TV_PATH": os.path.join(workdir, "tv"),
+        "MEDIA_MOVIES_PATH": os.path.join(workdir, "movies"),
+        "TORBOX_BASE_URL": fake_url,
+        "TORBOX_API_KEY": "bench",
+        "TORBOX_RATE_PER_SEC": str(args.torbox_rate),
+        "TORBOX_BURST": str(int(args.torbox_rate)),
+    })
+    sys.path.insert(0, SERVICE_DIR)
+    try:
+        import config
+        config.load_config()
+        seed_start = time.perf_counter()
+        seed_jobs(args.jobs)
+        seed_seconds = time.perf_counter() - seed_start
+
+        import app as autostrm_app
+        import metrics
+        from werkzeug.serving import make_server
+
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        flask_app = autostrm_app.create_app()
+        server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_port}"
+
+        results: dict = defaultdict(list)
+        lock = threading.Lock()
+        deadline = time.time() + args.duration
+        threads = [threading.Thread(target=poll_client, args=(base, deadline, results, lock, args.etag))
+                   for _ in range(args.clients)]
+        if args.add_rate > 0:
+            threads.append(threading.Thread(target=add_client, args=(base, deadline, args.add_rate, results, lock)))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        server.shutdown()
+
+        stats = requests.get(f"{fake_url}/_stats", timeout=5).json()
+        cycles, cycle_sum = metrics.WORKER_CYCLE.totals()
+        total_calls = sum(stats["calls"].values())
+        report = {
+            "jobs": args.jobs,
+            "clients": args.clients,
+            "duration_s": args.duration,
+            "seed_s": round(seed_seconds, 3),
+            "requests": {
+                name: {
+                    "count": len(lat),
+                    "rps": round(len(lat) / args.duration, 1),
+                    "p50_ms": round(_percentile(lat, 0.50) * 1000, 2),
+                    "p99_ms": round(_percentile(lat, 0.99) * 1000, 2),
+                }
+                for name, lat in results.items() if name != "errors" and lat
+            },
+            "http_errors": sum(results["errors"]),
+            "worker": {
+                "cycles": cycles,
+                "mean_cycle_s": round(cycle_sum / cycles, 3) if cycles else None,
+                "p99_cycle_s": round(metrics.WORKER_CYCLE.quantile(0.99) or 0.0, 3),
+                "jobs_checked": metrics.WORKER_JOBS.value(),
+            },
+            "jobs_by_state": config.state_store.count_by_state(),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "torbox_calls": stats["calls"],
+            "torbox_calls_per_job": round(total_calls / max(1, args.jobs), 4),
+        }
+    finally:
+        fake.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"AutoStrm benchmark: {args.jobs} jobs, {args.clients} clients, {args.duration:.0f}s (seeded in {report['seed_s']}s)")
+    for name, r in report["requests"].items():
+        print(f"  {name:<16} {r['count']:>7} req  {r['rps']:>8} req/s  p50 {r['p50_ms']:>8} ms  p99 {r['p99_ms']:>8} ms")
+    w = report["worker"]
+    print(f"  worker           {w['cycles']} cycles, mean {w['mean_cycle_s']}s, p99 ~{w['p99_cycle_s']}s, {w['jobs_checked']} job checks")
+    print(f"  jobs by state    {report['jobs_by_state']}")
+    print(f"  peak RSS         {report['peak_rss_mb']} MB")
+    print(f"  TorBox calls     {sum(report['torbox_calls'].values())} ({report['torbox_calls_per_job']} per job) {report['torbox_calls']}")
+    print(f"  HTTP errors      {report['http_errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Fake TorBox notifier
+Posts TorBox-style "download ready" notifications to AutoStrm's /webhook/torbox
+endpoint, for exercising push ingestion without a TorBox account.
+"""
+
+import argparse
+import sys
+from datetime import datetime, timezone
+
+import requests
+
+
+def build_payload(args) -> dict:
+    if args.style == "torbox":
+        # shape of TorBox's own notification webhooks: a title and a human message
+        name = args.name or "Unknown"
+        payload = {
+            "type": "notification",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "data": {"title": "Download Ready", "message": f"{name} has finished downloading and is ready."},
+        }
+    else:
+        payload = {"event": "download_ready", "data": {}}
+        if args.name:
+            payload["data"]["name"] = args.name
+    if args.torrent_id is not None:
+        payload["data"]["torrent_id"] = args.torrent_id
+    if args.hash:
+        payload["data"]["hash"] = args.hash.lower()
+    return payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a fake TorBox download-ready notification to AutoStrm")
+    parser.add_argument('--url', default='http://127.0.0.1:6500/webhook/torbox', help='Webhook URL')
+    parser.add_argument('--secret', required=True, help='WEBHOOK_SECRET configured in AutoStrm')
+    parser.add_argument('--torrent-id', type=int, help='TorBox torrent id of the finished download')
+    parser.add_argument('--hash', help='Info hash of the finished download')
+    parser.add_argument('--name', help='Torrent name (matched against job names)')
+    parser.add_argument('--style', choices=['torbox', 'ids'], default='ids',
+                        help='torbox: title/message notification; ids: structured ids')
+    parser.add_argument('--repeat', type=int, default=1, help='Send the notification N times')
+    args = parser.parse_args()
+
+    if args.torrent_id is None and not args.hash and not args.name:
+        parser.error('one of --torrent-id, --hash or --name is required')
+
+    payload = build_payload(args)
+    for _ in range(args.repeat):
+        resp = requests.post(args.url, json=payload, headers={'Authorization': f'Bearer {args.secret}'}, timeout=10)
+        print(f"{resp.status_code} {resp.text.strip()}")
+        if resp.status_code >= 400:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
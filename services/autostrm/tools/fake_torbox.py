@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Fake TorBox API
+A local stand-in for the TorBox endpoints AutoStrm uses (asynccreatetorrent,
+mylist, getqueued, checkcached, controltorrent, createstream, getstreamdata),
+with configurable latency, error rate and 429 rate, for load tests and benchmarks.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_BTIH = re.compile(r"btih:([0-9a-fA-F]{40})")
+
+
+def seed_torrent(i: int) -> tuple[int, str, str]:
+    """(torrent id, info hash, name) of the i-th pre-seeded torrent; shared with bench.py."""
+    return i + 1, hashlib.sha1(f"bench-{i}".encode()).hexdigest(), f"Bench.Show.S{i // 100 % 99 + 1:02d}E{i % 100 + 1:02d}.1080p.WEB-DL"
+
+
+class FakeTorBox:
+    """
+    In-memory TorBox account. A torrent downloads linearly and finishes
+    `complete_after` seconds after it was created; pre-seeded torrents are
+    spread over that window so a benchmark sees a steady stream of completions.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, rate_429: float = 0.0,
+                 complete_after: float = 60.0, files_per_torrent: int = 1, seed: int = 0) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.complete_after = complete_after
+        self.files_per_torrent = files_per_torrent
+        self.calls: Counter = Counter()
+        self.torrents: dict[int, dict] = {}
+        self._order: list[int] = []
+        self._lock = threading.Lock()
+        now = time.time()
+        for i in range(seed):
+            tid, ih, name = seed_torrent(i)
+            self._add(tid, ih, name, now - random.random() * complete_after)
+
+    def _add(self, tid: int, ih: str, name: str, created: float) -> dict:
+        t = {"id": tid, "hash": ih, "name": name, "created": created, "size": 1_500_000_000}
+        with self._lock:
+            self.torrents[tid] = t
+            self._order.append(tid)
+        return t
+
+    def create(self, magnet: str | None, body: bytes) -> dict:
+        m = _BTIH.search(magnet or "")
+        ih = m.group(1).lower() if m else hashlib.sha1(body).hexdigest()
+        with self._lock:
+            existing = next((t for t in self.torrents.values() if t["hash"] == ih), None)
+            if existing:
+                return existing
+            tid = max(self.torrents, default=0) + 1
+            t = self.torrents[tid] = {"id": tid, "hash": ih, "name": f"Torrent {tid}", "created": time.time(), "size": 1_500_000_000}
+            self._order.append(tid)
+            return t
+
+    def item(self, t: dict) -> dict:
+        progress = min(1.0, (time.time() - t["created"]) / self.complete_after) if self.complete_after > 0 else 1.0
+        done = progress >= 1.0
+        speed = int(t["size"] / self.complete_after) if self.complete_after > 0 else 0
+        return {
+            "id": t["id"],
+            "hash": t["hash"],
+            "name": t["name"],
+            "size": t["size"],
+            "progress": round(progress, 4),
+            "download_state": "completed" if done else "downloading",
+            "download_finished": done,
+            "download_present": done,
+            "download_speed": 0 if done else speed,
+            "upload_speed": 0,
+            "eta": 0 if done else int((1.0 - progress) * self.complete_after),
+            "files": [
+                {"id": n, "name": f"{t['name']}/{t['name']}.part{n}.mkv", "short_name": f"{t['name']}.part{n}.mkv",
+                 "size": t["size"] // self.files_per_torrent}
+                for n in range(self.files_per_torrent)
+            ],
+        }
+
+    def mylist(self, params: dict) -> list[dict]:
+        with self._lock:
+            if "id" in params:
+                t = self.torrents.get(int(params["id"]))
+                return [self.item(t)] if t else []
+            offset = int(params.get("offset", 0))
+            limit = int(params.get("limit", 1000))
+            ids = self._order[offset:offset + limit]
+            return [self.item(self.torrents[i]) for i in ids if i in self.torrents]
+
+    def delete(self, tid: int) -> None:
+        with self._lock:
+            if self.torrents.pop(tid, None):
+                self._order.remove(tid)
+
+
+def make_handler(fake: FakeTorBox):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, obj, headers: dict | None = None) -> None:
+            body = json.dumps(obj).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _injected_failure(self) -> bool:
+            if fake.latency or fake.jitter:
+                time.sleep(max(0.0, fake.latency + random.uniform(-fake.jitter, fake.jitter)))
+            r = random.random()
+            if r < fake.rate_429:
+                self._send(429, {"success": False, "error": "TOO_MANY_REQUESTS"}, {"Retry-After": "1"})
+                return True
+            if r < fake.rate_429 + fake.error_rate:
+                self._send(503, {"success": False, "error": "SERVICE_UNAVAILABLE"})
+                return True
+            return False
+
+        def _route(self, method: str) -> None:
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            if url.path == "/_stats":
+                self._send(200, {"calls": dict(fake.calls), "torrents": len(fake.torrents)})
+                return
+            fake.calls[url.path] += 1
+            if self._injected_failure():
+                return
+
+            if url.path == "/v1/api/torrents/mylist":
+                self._send(200, {"success": True, "data": fake.mylist(params)})
+            elif url.path == "/v1/api/queued/getqueued":
+                self._send(200, {"success": True, "data": []})
+            elif url.path == "/v1/api/torrents/checkcached":
+                hashes = [h.lower() for h in params.get("hash", "").split(",") if h]
+                known = {t["hash"] for t in fake.torrents.values()}
+                self._send(200, {"success": True, "data": {h: {"name": h} for h in hashes if h in known}})
+            elif url.path == "/v1/api/torrents/asynccreatetorrent" and method == "POST":
+                ctype = self.headers.get("Content-Type", "")
+                form = {k: v[0] for k, v in parse_qs(body.decode("utf-8", "replace")).items()} if "urlencoded" in ctype else {}
+                t = fake.create(form.get("magnet"), body)
+                self._send(200, {"success": True, "data": {"torrent_id": t["id"], "hash": t["hash"]}})
+            elif url.path == "/v1/api/torrents/controltorrent" and method == "POST":
+                payload = json.loads(body or b"{}")
+                if payload.get("operation") == "delete" and payload.get("torrent_id") is not None:
+                    fake.delete(int(payload["torrent_id"]))
+                self._send(200, {"success": True, "data": None})
+            elif url.path == "/v1/api/stream/createstream":
+                token = hashlib.sha1(f"{params.get('id')}:{params.get('file_id')}".encode()).hexdigest()
+                self._send(200, {"success": True, "data": {"token": token, "presigned_token": token[:16]}})
+            elif url.path == "/v1/api/stream/getstreamdata":
+                expires = int(time.time()) + 3600
+                host = self.headers.get("Host", "127.0.0.1")
+                self._send(200, {"success": True, "data": {
+                    "hls_url": f"http://{host}/stream/{params.get('token')}.m3u8?expires={expires}"}})
+            else:
+                self._send(404, {"success": False, "error": "NOT_FOUND"})
+
+        def do_GET(self):
+            self._route("GET")
+
+        def do_POST(self):
+            self._route("POST")
+
+        def do_DELETE(self):
+            self._route("DELETE")
+
+    return Handler
+
+
+def serve(fake: FakeTorBox, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the fake API on a daemon thread; port 0 picks a free port (see server.server_port)."""
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-torbox", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake TorBox API for AutoStrm load tests")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='Added latency per call (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- random latency (seconds)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of calls answered with 503')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Fraction of calls answered with 429')
+    parser.add_argument('--complete-after', type=float, default=60.0, help='Seconds for a torrent to finish')
+    parser.add_argument('--files', type=int, default=1, help='Media files per torrent')
+    parser.add_argument('--seed', type=int, default=0, help='Pre-create N torrents (ids/hashes as seed_torrent)')
+    args = parser.parse_args()
+
+    fake = FakeTorBox(args.latency, args.jitter, args.error_rate, args.rate_429, args.complete_after, args.files, args.seed)
+    server = serve(fake, args.host, args.port)
+    print(f"Fake TorBox listening on http://{args.host}:{server.server_port} ({len(fake.torrents)} torrents)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
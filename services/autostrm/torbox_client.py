@@ -1,7 +1,11 @@
 import os
 import time
+import random
 import typing as t
 import logging
+import threading
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 import requests
 
 log = logging.getLogger("torbox")
@@ -9,13 +13,166 @@ log.setLevel(logging.INFO)
 
 
 class TorBoxError(Exception):
-    pass
+    def __init__(self, message: str, status: int | None = None) -> None:
+        super().__init__(message)
+        self.status = status  # HTTP status when the API answered, else None
 
 
 def _env(name: str, default: str | None = None) -> str | None:
     return os.getenv(name, default)
 
 
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` requests per second with bursts up to `burst`.
+    pause_until() stops all callers until a server-imposed Retry-After has passed.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = max(rate, 0.001)
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause_until(self, when: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, when)
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures (5xx, connection errors) and
+    fails fast for `cooldown` seconds; then lets one trial call through
+    (half-open) and closes again on success.
+    """
+
+    def __init__(self, threshold: int, cooldown: float) -> None:
+        self.threshold = max(threshold, 1)
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def check(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial:
+                raise TorBoxError("TorBox circuit breaker open; failing fast")
+            self._trial = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.threshold:
+                if self._opened_at is None or self._trial:
+                    log.warning("TorBox: circuit breaker opened after %d failures", self._failures)
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: t.Any = None
+        self.error: BaseException | None = None
+
+
+class ListCache:
+    """
+    Single-flight + short-TTL cache for TorBox list endpoints.
+
+    Concurrent identical requests share one in-flight call. Results are kept
+    for `ttl` seconds keyed by endpoint and parameters; a bypass_cache request
+    skips the cached value but still refreshes it for later callers.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 256) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: dict[tuple, tuple[float, list]] = {}
+        self._inflight: dict[tuple, _Call] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, fetch: t.Callable[[], list], bypass: bool = False) -> list:
+        flight_key = key + (bypass,)
+        with self._lock:
+            now = time.monotonic()
+            if not bypass and self.ttl > 0:
+                entry = self._entries.get(key)
+                if entry and entry[0] > now:
+                    self.hits += 1
+                    return list(entry[1])
+            call = self._inflight.get(flight_key)
+            leader = call is None
+            if leader:
+                call = self._inflight[flight_key] = _Call()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return list(call.result)
+
+        try:
+            call.result = fetch()
+            with self._lock:
+                if self.ttl > 0:
+                    if len(self._entries) >= self.max_entries:
+                        now = time.monotonic()
+                        self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                    self._entries[key] = (time.monotonic() + self.ttl, call.result)
+            return list(call.result)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(flight_key, None)
+            call.event.set()
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "entries": len(self._entries)}
+
+
+# Shared by every TorBoxClient in the process (web blueprint and worker) so the
+# API quota is budgeted once.
+_shared_limiter = TokenBucket(float(_env("TORBOX_RATE_PER_SEC", "5")), int(_env("TORBOX_BURST", "10")))
+_shared_breaker = CircuitBreaker(int(_env("TORBOX_BREAKER_THRESHOLD", "5")), float(_env("TORBOX_BREAKER_COOLDOWN", "30")))
+_shared_list_cache = ListCache(float(_env("TORBOX_LIST_CACHE_TTL", "5")))
+# info hash -> torrent_id, learned from every mylist page that passes through any client
+_hash_to_torrent_id: dict[str, int] = {}
+
+
 class TorBoxClient:
     """
     TorBox API client aligned to the provided OpenAPI.
@@ -27,7 +184,10 @@ class TorBoxClient:
     Key endpoints used
     - POST /v1/api/torrents/asynccreatetorrent  (multipart/form-data)
     - GET  /v1/api/torrents/mylist              (status/details)
+    - GET  /v1/api/queued/getqueued             (torrents waiting for a slot)
+    - GET  /v1/api/torrents/checkcached         (batch cached-availability check)
     - POST /v1/api/torrents/controltorrent      (pause/resume/delete)
+    - POST /v1/api/queued/controlqueued         (delete a queued torrent)
     - DELETE /v1/api/integration/job/{job_id}   (not used by default here)
     - GET  /v1/api/stream/createstream          (stream tokens)
     - GET  /v1/api/stream/getstreamdata         (resolve streamable URL)
@@ -39,6 +199,12 @@ class TorBoxClient:
         api_key: str | None = None,
         timeout: float = 30.0,
         session: requests.Session | None = None,
+        max_workers: int | None = None,
+        call_deadline: float | None = None,
+        limiter: TokenBucket | None = None,
+        breaker: CircuitBreaker | None = None,
+        max_retries: int | None = None,
+        list_cache: ListCache | None = None,
     ) -> None:
         self.base_url = (base_url or _env("TORBOX_BASE_URL") or "https://api.torbox.app").rstrip("/")
         self.api_key = api_key or _env("TORBOX_API_KEY")
@@ -46,6 +212,23 @@ class TorBoxClient:
             log.warning("TORBOX_API_KEY not set; TorBox operations will fail.")
         self.timeout = timeout
         self.session = session or requests.Session()
+        # Concurrent mode (*_many helpers): bounded pool, per-call deadline
+        self.max_workers = max_workers or int(_env("TORBOX_CONCURRENCY", "4"))
+        self.call_deadline = call_deadline or float(_env("TORBOX_CALL_DEADLINE", str(timeout)))
+        self._pool: ThreadPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
+        self._tls = threading.local()
+        # Rate limiting / retries: GETs retry on 429, 5xx and connection errors with
+        # jittered exponential backoff; POSTs only on 429 (the request was not applied)
+        self.limiter = limiter or _shared_limiter
+        self.breaker = breaker or _shared_breaker
+        self.max_retries = int(_env("TORBOX_MAX_RETRIES", "3")) if max_retries is None else max_retries
+        self.backoff_base = 0.5
+        self.backoff_cap = 30.0
+        self.list_cache = list_cache or _shared_list_cache
+
+    # Timing hook (path, method, status or "error", seconds); metrics.py installs a histogram here
+    observe = staticmethod(lambda path, method, status, seconds: None)
 
     # --------------- Low-level HTTP helpers ---------------
 
@@ -55,6 +238,9 @@ class TorBoxClient:
             h["Authorization"] = f"Bearer {self.api_key}"
         return h
 
+    def _timeout(self) -> float:
+        return getattr(self._tls, "deadline", None) or self.timeout
+
     def _url(self, path: str) -> str:
         if path.startswith("http"):
             return path
@@ -62,25 +248,77 @@ class TorBoxClient:
             path = "/" + path
         return f"{self.base_url}{path}"
 
-    def _get(self, path: str, params: dict | None = None) -> requests.Response:
+    @staticmethod
+    def _retry_after(resp: requests.Response) -> float | None:
+        value = resp.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except Exception:
+            return None
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def _request(self, method: str, path: str, idempotent: bool, retries: int | None = None,
+                 timeout: float | None = None, **kwargs: t.Any) -> requests.Response:
         url = self._url(path)
-        resp = self.session.get(url, headers=self._headers(), params=params, timeout=self.timeout)
-        self._raise_for_error(resp, url)
-        return resp
+        max_retries = self.max_retries if retries is None else retries
+        attempt = 0
+        while True:
+            self.breaker.check()
+            self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                resp = self.session.request(method, url, timeout=timeout or self._timeout(), **kwargs)
+            except requests.RequestException as e:
+                self.observe(path, method, "error", time.perf_counter() - start)
+                self.breaker.record_failure()
+                if idempotent and attempt < max_retries:
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                raise TorBoxError(f"{method} {url} failed: {e}") from e
+
+            status = resp.status_code
+            self.observe(path, method, status, time.perf_counter() - start)
+            # a 429 means the API is up, just throttling us: it never trips the breaker
+            if status >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            if status == 429 or status >= 500:
+                retry_after = self._retry_after(resp)
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                if status == 429:
+                    # every caller sharing the limiter waits out the Retry-After
+                    self.limiter.pause_until(time.monotonic() + delay)
+                if (idempotent or status == 429) and attempt < max_retries:
+                    log.info("TorBox: HTTP %s for %s, retrying in %.1fs (attempt %d)", status, url, delay, attempt + 1)
+                    if status != 429:
+                        time.sleep(delay)
+                    attempt += 1
+                    continue
+            self._raise_for_error(resp, url)
+            return resp
+
+    def _get(self, path: str, params: dict | None = None, retries: int | None = None,
+             timeout: float | None = None) -> requests.Response:
+        return self._request("GET", path, idempotent=True, retries=retries, timeout=timeout,
+                             headers=self._headers(), params=params)
 
     def _post_json(self, path: str, payload: dict) -> requests.Response:
-        url = self._url(path)
-        resp = self.session.post(url, headers=self._headers(), json=payload, timeout=self.timeout)
-        self._raise_for_error(resp, url)
-        return resp
+        return self._request("POST", path, idempotent=False, headers=self._headers(), json=payload)
 
     def _post_form(self, path: str, data: dict, files: dict | None = None) -> requests.Response:
-        url = self._url(path)
         headers = dict(self._headers())
         headers.pop("Accept", None)  # let requests set multipart headers
-        resp = self.session.post(url, headers=headers, data=data, files=files, timeout=self.timeout)
-        self._raise_for_error(resp, url)
-        return resp
+        return self._request("POST", path, idempotent=False, headers=headers, data=data, files=files)
 
     @staticmethod
     def _raise_for_error(resp: requests.Response, url: str) -> None:
@@ -90,7 +328,7 @@ class TorBoxClient:
             body = resp.json()
         except Exception:
             body = resp.text[:1000]
-        raise TorBoxError(f"HTTP {resp.status_code} for {url}: {body}")
+        raise TorBoxError(f"HTTP {resp.status_code} for {url}: {body}", status=resp.status_code)
 
     @staticmethod
     def _json(resp: requests.Response) -> dict | list | None:
@@ -112,10 +350,11 @@ class TorBoxClient:
         allow_zip: bool | None = None,
         category: str | None = None,  # accepted for compatibility; not used by TorBox API
         tags: str | None = None,      # accepted for compatibility; not used by TorBox API
-    ) -> t.Any:
+    ) -> tuple[str | None, t.Any]:
         """
         Create a torrent from a magnet (async).
-        Returns a single task identifier suitable for storage (prefers torrent_id, then queued_id, then info_hash).
+        Returns (kind, task id) for storage: the torrent_id ("torrent"), else the
+        queued_id ("queued"), else the info hash ("hash"); (None, None) if none was found.
         """
         if not magnet:
             raise TorBoxError("submit_magnet requires a magnet string")
@@ -135,10 +374,10 @@ class TorBoxClient:
         resp = self._post_form("/v1/api/torrents/asynccreatetorrent", data=data, files=None)
         obj = self._json(resp) or {}
         result = self._extract_creation_result(obj)
-        task_id = self._choose_task_id(result)
+        kind, task_id = self._choose_task_id(result)
         if task_id is None:
             log.warning("TorBox: could not determine task id from creation response: %s", result)
-        return task_id
+        return kind, task_id
 
     def submit_torrent_file(
         self,
@@ -150,10 +389,11 @@ class TorBoxClient:
         allow_zip: bool | None = None,
         category: str | None = None,  # accepted for compatibility
         tags: str | None = None,      # accepted for compatibility
-    ) -> t.Any:
+    ) -> tuple[str | None, t.Any]:
         """
         Create a torrent from a .torrent file (async).
-        Returns a single task identifier suitable for storage (prefers torrent_id, then queued_id, then info_hash).
+        Returns (kind, task id) for storage: the torrent_id ("torrent"), else the
+        queued_id ("queued"), else the info hash ("hash"); (None, None) if none was found.
         """
         if not file_bytes:
             raise TorBoxError("submit_torrent_file requires file bytes")
@@ -174,10 +414,10 @@ class TorBoxClient:
         resp = self._post_form("/v1/api/torrents/asynccreatetorrent", data=data, files=files)
         obj = self._json(resp) or {}
         result = self._extract_creation_result(obj)
-        task_id = self._choose_task_id(result)
+        kind, task_id = self._choose_task_id(result)
         if task_id is None:
             log.warning("TorBox: could not determine task id from creation response: %s", result)
-        return task_id
+        return kind, task_id
 
     @staticmethod
     def _extract_creation_result(obj: dict) -> dict:
@@ -207,15 +447,16 @@ class TorBoxClient:
         return {"torrent_id": tid, "queued_id": qid, "info_hash": ih, "status": status, "raw": obj}
 
     @staticmethod
-    def _choose_task_id(parsed: dict) -> t.Any:
+    def _choose_task_id(parsed: dict) -> tuple[str | None, t.Any]:
         """
-        Prefer torrent_id, then queued_id, then info_hash.
+        Prefer torrent_id, then queued_id, then info_hash; returns (kind, value).
+        Queued and torrent ids are separate number spaces, so the kind is kept.
         """
-        for key in ("torrent_id", "queued_id", "info_hash"):
+        for key, kind in (("torrent_id", "torrent"), ("queued_id", "queued"), ("info_hash", "hash")):
             v = parsed.get(key)
             if v is not None:
-                return v
-        return None
+                return kind, v
+        return None, None
 
     # --------------- Status/listing helpers ---------------
 
@@ -231,17 +472,102 @@ class TorBoxClient:
             params["offset"] = offset
         if limit is not None:
             params["limit"] = limit
-        resp = self._get("/v1/api/torrents/mylist", params=params)
-        data = self._json(resp)
+        items = self._cached_list("/v1/api/torrents/mylist", params)
+        for it in items:
+            ih, tid = it.get("hash") or it.get("info_hash"), it.get("id", it.get("torrent_id"))
+            if ih and isinstance(tid, int):
+                _hash_to_torrent_id[str(ih).lower()] = tid
+        return items
+
+    def _cached_list(self, path: str, params: dict[str, t.Any]) -> list[dict]:
+        """
+        GET a list endpoint through the shared single-flight/TTL cache.
+        """
+        bypass = bool(params.get("bypass_cache"))
+        key = (self.base_url, self.api_key, path) + tuple(sorted((k, v) for k, v in params.items() if k != "bypass_cache"))
+        return self.list_cache.get(key, lambda: self._unwrap_list(self._json(self._get(path, params=params))), bypass=bypass)
+
+    @staticmethod
+    def _unwrap_list(data: t.Any) -> list[dict]:
         if isinstance(data, list):
             return data
         if isinstance(data, dict):
             for k in ("data", "items", "results"):
                 if isinstance(data.get(k), list):
                     return data[k]
+            # single-item lookups (id=...) wrap one object; empty results carry data=null
+            if "data" in data:
+                return [data["data"]] if isinstance(data["data"], dict) else []
             return [data]
         return []
 
+    def check_cached(self, hashes: t.Iterable[str], timeout: float | None = None) -> set[str]:
+        """
+        Batch availability check. Returns the subset of info hashes TorBox has cached.
+        With a timeout, each request is tried once within it: the check sits in
+        front of a grab and callers go ahead without an answer rather than wait.
+        """
+        hashes = sorted({h.lower() for h in hashes if h})
+        if not hashes:
+            return set()
+        cached: set[str] = set()
+        for i in range(0, len(hashes), 100):
+            chunk = hashes[i:i + 100]
+            params = {"hash": ",".join(chunk), "format": "object", "list_files": False}
+            resp = self._get("/v1/api/torrents/checkcached", params=params,
+                             retries=0 if timeout else None, timeout=timeout)
+            data = self._json(resp) or {}
+            found = data.get("data") if isinstance(data, dict) else None
+            if isinstance(found, dict):
+                cached.update(k.lower() for k in found)
+            elif isinstance(found, list):
+                cached.update(str(it.get("hash", "")).lower() for it in found if isinstance(it, dict))
+        return cached & set(hashes)
+
+    def get_queued(
+        self, id: int | None = None, bypass_cache: bool | None = None, offset: int | None = None, limit: int | None = None
+    ) -> list[dict]:
+        params: dict[str, t.Any] = {"type": "torrent"}
+        if id is not None:
+            params["id"] = id
+        if bypass_cache is not None:
+            params["bypass_cache"] = bool(bypass_cache)
+        if offset is not None:
+            params["offset"] = offset
+        if limit is not None:
+            params["limit"] = limit
+        return self._cached_list("/v1/api/queued/getqueued", params)
+
+    def iter_pages(self, fetch: t.Callable[..., list[dict]], page_size: int = 1000, bypass_cache: bool = True) -> t.Iterator[dict]:
+        """
+        Walk a paginated list endpoint (get_torrents_mylist, get_queued) until a short page.
+        """
+        offset = 0
+        while True:
+            page = fetch(bypass_cache=bypass_cache, offset=offset, limit=page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            offset += page_size
+
+    def list_files(self, torrent_id: int) -> list[dict]:
+        items = self.get_torrents_mylist(id=torrent_id, bypass_cache=True)
+        return self.files_from_item(items[0]) if items else []
+
+    @staticmethod
+    def files_from_item(item: dict) -> list[dict]:
+        """
+        Normalize a mylist item's files to [{id, path, size}].
+        """
+        out = []
+        for f in item.get("files") or []:
+            out.append({
+                "id": f.get("id"),
+                "path": f.get("name") or f.get("short_name") or "",
+                "size": int(f.get("size") or 0),
+            })
+        return out
+
     # --------------- Control/cancel (compat with caller) ---------------
 
     def control_torrent(self, operation: str, torrent_id: int | None = None, all: bool | None = None) -> dict | None:
@@ -253,18 +579,48 @@ class TorBoxClient:
         resp = self._post_json("/v1/api/torrents/controltorrent", payload)
         return self._json(resp) or {}
 
+    def control_queued(self, operation: str, queued_id: int) -> dict | None:
+        payload = {"operation": operation, "queued_id": queued_id, "type": "torrent"}
+        resp = self._post_json("/v1/api/queued/controlqueued", payload)
+        return self._json(resp) or {}
+
+    @staticmethod
+    def task_ref(job: dict) -> dict:
+        """
+        Build a cancel_task reference from a stored job. The raw task id is only
+        used as the kind it was recorded as: a queued id is never a torrent id.
+        """
+        task_id, kind = job.get("torbox_task_id"), job.get("torbox_task_kind")
+        ref: dict[str, t.Any] = {"torrent_id": job.get("torbox_torrent_id"), "info_hash": job.get("info_hash")}
+        if task_id is not None:
+            if kind == "torrent" and ref["torrent_id"] is None:
+                ref["torrent_id"] = task_id
+            elif kind == "queued":
+                ref["queued_id"] = task_id
+            elif kind == "hash" and not ref["info_hash"]:
+                ref["info_hash"] = task_id
+        return ref
+
     def cancel_task(self, task_id: t.Any) -> bool:
         """
         Compatibility wrapper: qbittorrent_compat.py expects cancel_task(task_id).
         We try to interpret task_id and delete the torrent via control_torrent.
+        A dict reference (see task_ref) whose torrent cannot be resolved from its
+        id or info hash is deleted from the TorBox queue by its queued_id.
         """
         torrent_id: int | None = None
         info_hash: str | None = None
+        queued_id: t.Any = None
 
         # If it's a parsed dict
         if isinstance(task_id, dict):
             torrent_id = task_id.get("torrent_id") or task_id.get("id")
             info_hash = task_id.get("info_hash") or task_id.get("hash")
+            queued_id = task_id.get("queued_id")
+            if isinstance(torrent_id, str) and torrent_id.isdigit():
+                torrent_id = int(torrent_id)
+            if info_hash:
+                info_hash = str(info_hash).lower()
 
         # If it's a string or int
         elif isinstance(task_id, int):
@@ -280,6 +636,8 @@ class TorBoxClient:
                     info_hash = s
 
         # If we only have an info hash, try to resolve to torrent_id
+        if torrent_id is None and info_hash:
+            torrent_id = _hash_to_torrent_id.get(info_hash)
         if torrent_id is None and info_hash:
             try:
                 items = self.get_torrents_mylist(bypass_cache=True)
@@ -293,17 +651,88 @@ class TorBoxClient:
             except Exception as e:
                 log.warning("TorBox: error resolving info_hash to torrent_id: %s", e)
 
+        if torrent_id is None and queued_id is not None:
+            try:
+                self.control_queued("delete", queued_id=int(queued_id))
+                return True
+            except Exception as e:
+                log.error("TorBox: cancel_task failed for queued_id=%s: %s", queued_id, e)
+                return False
+
         if torrent_id is None:
             log.warning("TorBox: cancel_task could not resolve torrent_id from %r", task_id)
             return False
 
         try:
             self.control_torrent("delete", torrent_id=torrent_id)
+            if info_hash:
+                _hash_to_torrent_id.pop(info_hash, None)
             return True
         except Exception as e:
             log.error("TorBox: cancel_task failed for torrent_id=%s: %s", torrent_id, e)
             return False
 
+    # --------------- Concurrent execution ---------------
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="torbox")
+            return self._pool
+
+    def _with_deadline(self, fn: t.Callable, arg: t.Any, deadline: float) -> t.Any:
+        self._tls.deadline = deadline
+        try:
+            return fn(arg)
+        finally:
+            self._tls.deadline = None
+
+    def map_concurrent(self, fn: t.Callable[[t.Any], t.Any], items: t.Iterable[t.Any], deadline: float | None = None) -> list[t.Any]:
+        """
+        Run fn over items on the client's bounded pool (max_workers in flight).
+        Each call gets `deadline` seconds (default call_deadline) as its HTTP timeout,
+        and the batch stops waiting for a call once its deadline has passed since it
+        could have started. Results keep input order; failures are returned as
+        exception instances instead of raised.
+        """
+        items = list(items)
+        deadline = deadline or self.call_deadline
+        if not items:
+            return []
+        pool = self._executor()
+        start = time.monotonic()
+        futures = [pool.submit(self._with_deadline, fn, it, deadline) for it in items]
+        results: list[t.Any] = []
+        for i, fut in enumerate(futures):
+            # calls run in waves of max_workers; allow each wave its own deadline
+            wave_end = start + deadline * (i // self.max_workers + 1)
+            try:
+                results.append(fut.result(timeout=max(0.0, wave_end - time.monotonic())))
+            except FutureTimeout:
+                fut.cancel()
+                results.append(TorBoxError(f"deadline of {deadline}s exceeded"))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def list_files_many(self, torrent_ids: t.Iterable[int]) -> dict[int, list[dict] | Exception]:
+        torrent_ids = list(torrent_ids)
+        return dict(zip(torrent_ids, self.map_concurrent(self.list_files, torrent_ids)))
+
+    def create_streams_many(self, torrent_id: int, files: list[dict]) -> list[dict]:
+        """
+        Resolve a stream URL for every file of a torrent concurrently.
+        Returns copies of the files with stream_url set where resolution succeeded.
+        """
+        urls = self.map_concurrent(lambda f: self.get_stream_url(torrent_id, f.get("id")), files)
+        out = []
+        for f, url in zip(files, urls):
+            if isinstance(url, Exception):
+                log.warning("TorBox: stream for torrent %s file %s failed: %s", torrent_id, f.get("id"), url)
+                url = None
+            out.append(dict(f, stream_url=url) if url else dict(f))
+        return out
+
     # --------------- Stream helpers ---------------
 
     def create_stream(self, id: int, file_id: int | None = None, type: str | None = None, chosen_subtitle_index: t.Any = None, chosen_audio_index: int | None = None) -> dict:
@@ -329,4 +758,30 @@ class TorBoxClient:
         if chosen_audio_index is not None:
             params["chosen_audio_index"] = chosen_audio_index
         resp = self._get("/v1/api/stream/getstreamdata", params=params)
-        return self._json(resp) or {}
\ No newline at end of file
+        return self._json(resp) or {}
+
+    def get_stream_url(self, torrent_id: int, file_id: int | None = None) -> str | None:
+        """
+        createstream, then getstreamdata when only tokens come back; returns the playable URL.
+        """
+        created = self.create_stream(torrent_id, file_id=file_id, type="torrent")
+        url = self._extract_stream_url(created)
+        if url:
+            return url
+        data = created.get("data") if isinstance(created.get("data"), dict) else created
+        token, presigned = data.get("token"), data.get("presigned_token")
+        if token and presigned:
+            return self._extract_stream_url(self.get_stream_data(token, presigned))
+        return None
+
+    @staticmethod
+    def _extract_stream_url(obj: t.Any) -> str | None:
+        if isinstance(obj, str) and obj.startswith("http"):
+            return obj
+        if not isinstance(obj, dict):
+            return None
+        for k in ("stream_url", "hls_url", "playlist", "url", "link"):
+            v = obj.get(k)
+            if isinstance(v, str) and v.startswith("http"):
+                return v
+        return TorBoxClient._extract_stream_url(obj.get("data"))
\ No newline at end of file
@@ -0,0 +1,88 @@
+import hmac
+import logging
+import time
+from flask import Blueprint, jsonify, make_response, request
+from config import cfg, state_store
+from models import JobState
+import worker
+
+log = logging.getLogger("webhook")
+
+webhook_api = Blueprint("webhook_api", __name__)
+
+_NOTIFIABLE_STATES = (
+    JobState.QUEUED.value,
+    JobState.DOWNLOADING.value,
+    JobState.PROCESSING.value,
+    JobState.READY.value,
+)
+
+
+def _authorized() -> bool:
+    """Shared secret as a Bearer token, an X-Webhook-Secret header or a ?token= parameter."""
+    secret = cfg.webhook_secret
+    auth = request.headers.get("Authorization", "")
+    supplied = (
+        (auth[7:] if auth.lower().startswith("bearer ") else "")
+        or request.headers.get("X-Webhook-Secret", "")
+        or request.args.get("token", "")
+    )
+    return bool(secret) and hmac.compare_digest(supplied.encode(), secret.encode())
+
+
+def _identifiers(payload: dict) -> tuple[set[str], set[str], str]:
+    """(torrent/task ids, info hashes, free text) found at the top level or under "data"."""
+    ids, hashes, text = set(), set(), []
+    for obj in (payload, payload.get("data")):
+        if not isinstance(obj, dict):
+            continue
+        for key in ("torrent_id", "id", "queued_id", "task_id"):
+            if obj.get(key) not in (None, ""):
+                ids.add(str(obj[key]))
+        for key in ("hash", "info_hash"):
+            if obj.get(key):
+                hashes.add(str(obj[key]).lower())
+        for key in ("name", "title", "message"):
+            if isinstance(obj.get(key), str):
+                text.append(obj[key])
+    return ids, hashes, "\n".join(text)
+
+
+def match_jobs(payload: dict, jobs: dict) -> list[str]:
+    """
+    Hashes of the jobs a notification refers to: by torrent id / task id or info
+    hash, else (TorBox's plain "Download Ready" messages) by job name in the text.
+    """
+    ids, hashes, text = _identifiers(payload)
+    matched = [
+        h for h, j in jobs.items()
+        if h in hashes
+        or (j.get("info_hash") or "") in hashes
+        or str(j.get("torbox_torrent_id")) in ids
+        or str(j.get("torbox_task_id")) in ids
+    ]
+    if not matched and text:
+        folded = text.casefold()
+        matched = [h for h, j in jobs.items() if j.get("name") and j["name"].casefold() in folded]
+    return matched
+
+
+@webhook_api.route("/webhook/torbox", methods=["POST"])
+def torbox_webhook():
+    if not cfg.webhook_secret:
+        return make_response("Webhook disabled", 404)
+    if not _authorized():
+        return make_response("Unauthorized", 401)
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        payload = request.form.to_dict()
+    matched = match_jobs(payload, state_store.load_jobs(states=_NOTIFIABLE_STATES))
+    if matched:
+        # The worker re-checks jobs whose notified_at changed at once; in another
+        # process the leader sees the store version move and wakes it.
+        now = time.time()
+        state_store.update_jobs({h: {"notified_at": now} for h in matched})
+        worker.wake()
+    else:
+        log.info("Webhook matched no active job: %s", payload)
+    return jsonify({"matched": matched})
@@ -1,83 +1,350 @@
+import heapq
+import logging
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict
 from config import state_store, cfg
 from models import JobState
 from torbox_client import TorBoxClient, TorBoxError
 from strm_generator import generate_strm_files
+from stream_redirect import strm_target
+from metrics import WORKER_CYCLE, WORKER_CYCLE_JOBS, WORKER_JOBS, WORKER_SCHEDULED
+
+log = logging.getLogger("worker")
 
 _worker_thread = None
 _worker_stop = False
+_wake = threading.Event()
 
+_ACTIVE_STATES = (
+    JobState.QUEUED.value,
+    JobState.DOWNLOADING.value,
+    JobState.PROCESSING.value,
+    JobState.READY.value,
+)
 
-def _update_jobs_loop(interval_initial: int = 5, interval_max: int = 60):
-    client = TorBoxClient()
-    backoff = interval_initial
+_MEDIA_EXTENSIONS = (".mkv", ".mp4", ".avi", ".mov", ".m4v", ".wmv")
+
+_ready_pool = ThreadPoolExecutor(max_workers=cfg.worker_concurrency, thread_name_prefix="autostrm-ready")
+
+
+def wake() -> None:
+    """Signal the worker that jobs were added or handed to TorBox."""
+    _wake.set()
+
+
+def _sweep_account(client: TorBoxClient, page_size: int = 1000) -> Dict[str, dict]:
+    """
+    Fetch the whole TorBox account in a few paginated calls and index every
+    item by torrent id, "q:<queued id>" and lowercase info hash.
+    """
+    index: Dict[str, dict] = {}
+    for it in client.iter_pages(client.get_queued, page_size=page_size):
+        it = dict(it, download_state="queued")
+        if it.get("id") is not None:
+            index[f"q:{it['id']}"] = it
+        ih = str(it.get("hash") or "").lower()
+        if ih:
+            index[ih] = it
+    for it in client.iter_pages(client.get_torrents_mylist, page_size=page_size):
+        tid = it.get("id", it.get("torrent_id"))
+        if tid is not None:
+            index[str(tid)] = it
+        ih = str(it.get("hash") or it.get("info_hash") or "").lower()
+        if ih:
+            index[ih] = it
+    return index
+
+
+def _lookup(index: Dict[str, dict], job: dict) -> dict | None:
+    """
+    Find a job's account item: by info hash first (it survives a queued item
+    becoming a torrent with a new id), then by the id TorBox handed back.
+    Queued and torrent ids are separate number spaces, so a task id is only
+    looked up as the kind it was recorded as.
+    """
+    candidates = []
+    if job.get("info_hash"):
+        candidates.append(job["info_hash"].lower())
+    if job.get("torbox_torrent_id") is not None:
+        candidates.append(str(job["torbox_torrent_id"]))
+    task_id = str(job.get("torbox_task_id") or "")
+    kind = job.get("torbox_task_kind")
+    if task_id:
+        if kind == "torrent":
+            candidates.append(task_id)
+        elif kind == "queued":
+            candidates.append(f"q:{task_id}")
+        elif kind == "hash":
+            candidates.append(task_id.lower())
+        else:
+            # submitted before the kind was recorded
+            candidates += [task_id, f"q:{task_id}", task_id.lower()]
+    for key in candidates:
+        if key in index:
+            return index[key]
+    return None
+
+
+def _job_state(item: dict) -> str | None:
+    tor_state = str(item.get("download_state") or item.get("status") or "").lower()
+    if item.get("download_present") or item.get("download_finished"):
+        return JobState.READY.value
+    if tor_state in ("queued", "waiting"):
+        return JobState.QUEUED.value
+    if tor_state in ("downloading", "fetching", "transferring"):
+        return JobState.DOWNLOADING.value
+    if tor_state in ("processing", "preparing", "metadl", "checkingresumedata") or tor_state.startswith("stalled"):
+        return JobState.PROCESSING.value
+    if tor_state in ("ready", "complete", "completed", "finished", "cached", "uploading", "seeding"):
+        return JobState.READY.value
+    if tor_state.startswith(("error", "failed")):
+        return JobState.ERROR.value
+    return None
+
+
+def _reconcile(job: dict, item: dict) -> dict:
+    """
+    Compute the field changes for one job from its account item.
+    """
+    changes: dict = {}
+    state = _job_state(item) or job.get("state")
+    if state != job.get("state"):
+        changes["state"] = state
+
+    tid = item.get("id", item.get("torrent_id"))
+    if tid is not None and item.get("download_state") != "queued" and tid != job.get("torbox_torrent_id"):
+        changes["torbox_torrent_id"] = tid
+    # the job's own hash is authoritative; only learn one it could not derive
+    ih = str(item.get("hash") or item.get("info_hash") or "").lower()
+    if ih and not job.get("info_hash"):
+        changes["info_hash"] = ih
+
+    try:
+        progress = max(0.0, min(1.0, float(item.get("progress", job.get("progress", 0.0)))))
+    except (TypeError, ValueError):
+        progress = job.get("progress", 0.0)
+    eta = item.get("eta")
+    fields = {
+        "progress": progress,
+        "size": int(item.get("size") or job.get("size") or 0),
+        "dlspeed": int(item.get("download_speed") or 0),
+        "upspeed": int(item.get("upload_speed") or 0),
+        "eta": int(eta) if isinstance(eta, (int, float)) and eta >= 0 else -1,
+    }
+    changes.update({k: v for k, v in fields.items() if job.get(k) != v})
+    if changes.get("state") == JobState.ERROR.value:
+        changes["errored_at"] = int(time.time())
+
+    return changes
 
-    while not _worker_stop:
-        try:
-            jobs = state_store.load_jobs()
-            changed = False
-            for h, j in list(jobs.items()):
-                state = j.get("state", JobState.QUEUED.value)
 
-                if state in [JobState.DONE.value, JobState.ERROR.value, JobState.DELETED.value, JobState.PAUSED.value]:
-                    continue
+def _finish_ready(client: TorBoxClient, job: dict, files: list[dict] | Exception) -> dict:
+    """
+    Write a READY job's .strm files. In direct mode stream URLs are resolved first,
+    concurrently through the client's bounded pool.
+    """
+    try:
+        if isinstance(files, Exception):
+            raise files
+        tid = job.get("torbox_torrent_id")
+        media_files = [f for f in files if str(f.get("path", "")).lower().endswith(_MEDIA_EXTENSIONS) or f.get("stream_url")]
+        if cfg.strm_mode == "redirect":
+            # stable local URLs; the TorBox link is resolved on first play
+            media_files = [dict(f, stream_url=strm_target(job["hash"], f["id"])) for f in media_files if f.get("id") is not None]
+        else:
+            resolved = [f for f in media_files if f.get("stream_url")]
+            unresolved = [f for f in media_files if not f.get("stream_url")]
+            media_files = resolved + client.create_streams_many(tid, unresolved)
+        _generated = generate_strm_files(job, media_files)
+        return {"state": JobState.DONE.value, "progress": 1.0, "eta": 0, "dlspeed": 0, "completed_at": int(time.time())}
+    except Exception:
+        return {"state": JobState.ERROR.value, "errored_at": int(time.time())}
 
-                task_id = j.get("torbox_task_id")
-                if not task_id:
-                    j["state"] = JobState.ERROR.value
-                    changed = True
-                    continue
 
+def _next_interval(job: dict, misses: int, interval_min: float, interval_max: float) -> float:
+    """
+    Seconds until a job should be looked at again: soon while TorBox is preparing
+    it, about half the remaining ETA while downloading, rarely while queued.
+    """
+    if misses:
+        # submitted but not listed by TorBox yet
+        return min(interval_max, interval_min * 2 ** misses)
+    state = job.get("state")
+    if state == JobState.QUEUED.value:
+        return min(interval_max, 60)
+    if state == JobState.DOWNLOADING.value:
+        eta = job.get("eta")
+        if not isinstance(eta, (int, float)) or eta <= 0:
+            remaining = int(job.get("size") or 0) * (1.0 - float(job.get("progress") or 0.0))
+            speed = int(job.get("dlspeed") or 0)
+            eta = remaining / speed if speed > 0 and remaining > 0 else 6 * interval_min
+        return max(interval_min, min(interval_max, eta / 2))
+    if state == JobState.PROCESSING.value:
+        return 2 * interval_min
+    return interval_min
+
+
+class JobSchedule:
+    """
+    Min-heap of (next check, job hash). Rescheduling pushes a new entry and the
+    stale one is skipped when popped.
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, str]] = []
+        self._due: Dict[str, float] = {}
+
+    def __contains__(self, job_hash: str) -> bool:
+        return job_hash in self._due
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def push(self, job_hash: str, at: float) -> None:
+        self._due[job_hash] = at
+        heapq.heappush(self._heap, (at, job_hash))
+
+    def discard(self, job_hash: str) -> None:
+        self._due.pop(job_hash, None)
+
+    def pop_due(self, until: float) -> list[str]:
+        due = []
+        while self._heap and self._heap[0][0] <= until:
+            at, h = heapq.heappop(self._heap)
+            if self._due.get(h) == at:
+                del self._due[h]
+                due.append(h)
+        return due
+
+    def next_at(self) -> float | None:
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+
+def _sync(jobs: Dict[str, dict], schedule: JobSchedule, rev: int) -> tuple[int, dict]:
+    """
+    Pull jobs written since rev into the worker's view. New pollable jobs are
+    due immediately; jobs that left the active states are dropped.
+    Returns (new rev, field changes to store).
+    """
+    version, changed, removed = state_store.changes_since(rev)
+    if removed is None:
+        # rev predates compacted tombstones: changed is the full table
+        removed = jobs.keys() - changed.keys()
+    updates = {}
+    for h, j in changed.items():
+        if j.get("state") not in _ACTIVE_STATES:
+            jobs.pop(h, None)
+            schedule.discard(h)
+        elif j.get("torbox_task_id"):
+            notified = j.get("notified_at") and j.get("notified_at") != jobs.get(h, {}).get("notified_at")
+            jobs[h] = j
+            if h not in schedule or notified:
+                # new to the worker, or a webhook said it changed: check right away
+                schedule.push(h, 0.0)
+        elif j.get("state") != JobState.QUEUED.value:
+            updates[h] = {"state": JobState.ERROR.value, "errored_at": int(time.time())}
+        # QUEUED without a task id: still in the submission outbox
+    for h in removed:
+        jobs.pop(h, None)
+        schedule.discard(h)
+    return version, updates
+
+
+def _update_jobs_loop(interval_min: float = 5, interval_max: float = 300):
+    client = TorBoxClient()
+    schedule = JobSchedule()
+    jobs: Dict[str, dict] = {}
+    misses: Dict[str, int] = {}
+    rev = 0
+
+    while not _worker_stop:
+        due: Dict[str, dict] = {}
+        synced_rev = rev
+        try:
+            rev, updates = _sync(jobs, schedule, rev)
+            now = time.time()
+            # one account sweep serves every job, so take whatever falls due shortly too
+            due = {h: jobs[h] for h in schedule.pop_due(now + interval_min) if h in jobs}
+            if due:
+                cycle_start = time.perf_counter()
                 try:
-                    status = client.get_status(task_id)
-                except TorBoxError:
-                    continue
-
-                tor_state = str(status.get("status", "")).lower()
-                progress = float(status.get("progress", j.get("progress", 0.0)))
-
-                if tor_state in ("queued", "waiting"):
-                    j["state"] = JobState.QUEUED.value
-                elif tor_state in ("downloading", "fetching", "transferring"):
-                    j["state"] = JobState.DOWNLOADING.value
-                elif tor_state in ("processing", "preparing"):
-                    j["state"] = JobState.PROCESSING.value
-                elif tor_state in ("ready", "complete", "completed", "finished"):
-                    j["state"] = JobState.READY.value
-                elif tor_state in ("error", "failed"):
-                    j["state"] = JobState.ERROR.value
-
-                j["progress"] = max(0.0, min(1.0, progress))
-
-                if j["state"] == JobState.READY.value:
-                    try:
-                        files = client.list_files(task_id)
-                        media_files = [f for f in files if str(f.get("path", "")).lower().endswith((".mkv", ".mp4", ".avi", ".mov", ".m4v", ".wmv")) or f.get("stream_url")]
-                        _generated = generate_strm_files(j, media_files)
-                        j["state"] = JobState.DONE.value
-                        j["progress"] = 1.0
-                    except Exception:
-                        j["state"] = JobState.ERROR.value
-
-                changed = True
-
-            if changed:
-                state_store.save_jobs(jobs)
-                backoff = interval_initial
-            else:
-                backoff = min(interval_max, int(backoff * 1.5))
+                    index = _sweep_account(client)
+                except TorBoxError as e:
+                    log.warning("Account sweep failed: %s", e)
+                    index = None
+                if index is None:
+                    for h in due:
+                        schedule.push(h, now + interval_max / 4)
+                else:
+                    ready = []
+                    for h in due:
+                        j = jobs[h]
+                        item = _lookup(index, j)
+                        if item is None:
+                            misses[h] = misses.get(h, 0) + 1
+                            continue
+                        misses.pop(h, None)
+                        changes = _reconcile(j, item)
+                        if changes:
+                            updates[h] = changes
+                            jobs[h] = dict(j, **changes)
+                        if changes.get("state", j.get("state")) == JobState.READY.value:
+                            ready.append((h, jobs[h], item))
+                    # READY jobs finish in parallel so one slow file list or stream call
+                    # does not hold up the rest of the cycle; files missing from the
+                    # sweep are listed in one batch under the client's per-call deadline
+                    files = {h: TorBoxClient.files_from_item(item) for h, _j, item in ready}
+                    unlisted = {j.get("torbox_torrent_id") for h, j, _item in ready if not files[h]}
+                    listed = client.list_files_many(tid for tid in unlisted if tid is not None)
+                    for h, j, _item in ready:
+                        if not files[h]:
+                            files[h] = listed.get(j.get("torbox_torrent_id"), [])
+                    finished = _ready_pool.map(lambda r: _finish_ready(client, r[1], files[r[0]]), ready)
+                    for (h, _j, _item), changes in zip(ready, finished):
+                        updates.setdefault(h, {}).update(changes)
+                        jobs[h] = dict(jobs[h], **changes)
+                    now = time.time()
+                    for h in due:
+                        if jobs[h].get("state") in _ACTIVE_STATES:
+                            interval = _next_interval(jobs[h], misses.get(h, 0), interval_min, interval_max)
+                            if cfg.webhook_secret and not misses.get(h):
+                                # completions are pushed; polling is only a safety net
+                                interval = max(interval, cfg.webhook_poll_interval)
+                            schedule.push(h, now + interval)
+                        else:
+                            jobs.pop(h)
+                            misses.pop(h, None)
+                WORKER_CYCLE.observe(time.perf_counter() - cycle_start)
+                WORKER_CYCLE_JOBS.observe(len(due))
+                WORKER_JOBS.inc(len(due))
+            WORKER_SCHEDULED.set(len(schedule))
+
+            if updates:
+                state_store.update_jobs(updates)
 
         except Exception:
-            backoff = min(interval_max, int(backoff * 1.5))
+            log.exception("Worker cycle failed")
+            # nothing from this cycle was stored: put every popped job back as it
+            # was, so none silently drops out of polling, and re-read the changes
+            retry_at = time.time() + interval_max / 4
+            for h, j in due.items():
+                jobs[h] = j
+                schedule.push(h, retry_at)
+            rev = synced_rev
 
-        time.sleep(backoff)
+        next_at = schedule.next_at()
+        timeout = interval_max if next_at is None else next_at - time.time()
+        _wake.wait(max(0.0, min(interval_max, timeout)))
+        _wake.clear()
 
 
 def start_worker():
     global _worker_thread
     if _worker_thread and _worker_thread.is_alive():
         return
-    t = threading.Thread(target=_update_jobs_loop, name="autostrm-worker", daemon=True)
-    t.start()
\ No newline at end of file
+    _worker_thread = threading.Thread(target=_update_jobs_loop, name="autostrm-worker", daemon=True)
+    _worker_thread.start()